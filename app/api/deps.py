@@ -7,6 +7,7 @@ from fastapi.security import OAuth2PasswordBearer
 
 from app.constants.enum import UserRole
 from app.core.config import settings
+from app.core.engine import EngineProxy
 from app.core.telegram_client import ClientManager
 from app.crud.user import UserCRUD
 from app.db.models import UserModel
@@ -49,7 +50,7 @@ def auth_dependency(request: Request, user=Depends(get_current_user)):
     request.state.user = user
 
 
-def get_client_manager(request: Request) -> ClientManager:
+def get_client_manager(request: Request) -> ClientManager | EngineProxy:
     return request.app.state.client_manager
 
 
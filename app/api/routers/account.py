@@ -1,7 +1,7 @@
 import logging
 from typing import List
 
-from fastapi import APIRouter, Depends, status, Query, Request, HTTPException
+from fastapi import APIRouter, Depends, status, Query, Request, HTTPException, File, UploadFile
 from starlette.responses import JSONResponse
 
 from app.api.deps import auth_dependency, get_client_manager
@@ -9,7 +9,7 @@ from app.core.telegram_client import ClientManager
 from app.db.models import UserModel
 from app.exceptions import AlreadyAuthenticatedError, GetClientError, UpdateRecordError, PermissionDeniedError
 from app.schemas.account import AccountCreate, AccountOut, AccountFilter, SendCodeOut, \
-    AccountSignIn, AccountSignInOut
+    AccountSignIn, AccountSignInOut, BatchSendCode, BatchSendCodeOut, AccountImport, AccountImportOut
 from app.schemas.common import PageResponse, Pagination
 from app.services.account import AccountService
 
@@ -60,6 +60,54 @@ async def read_accounts(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+@router.post(
+    '/import/',
+    response_model=AccountImportOut,
+    status_code=status.HTTP_200_OK,
+    summary="Import authorized StringSessions"
+)
+async def import_string_sessions(request: Request, items: List[AccountImport]):
+    current_user: UserModel = request.state.user
+
+    try:
+        return await service.import_string_sessions(current_user.id, items)
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post(
+    '/import/files/',
+    response_model=AccountImportOut,
+    status_code=status.HTTP_200_OK,
+    summary="Import authorized .session files"
+)
+async def import_session_files(request: Request, files: List[UploadFile] = File(...)):
+    current_user: UserModel = request.state.user
+
+    try:
+        return await service.import_session_files(current_user.id, files)
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post(
+    '/send-code/',
+    response_model=List[BatchSendCodeOut],
+    status_code=status.HTTP_200_OK,
+    summary="Start login for multiple accounts"
+)
+async def send_codes(request: Request, data: BatchSendCode):
+    current_user: UserModel = request.state.user
+
+    try:
+        return await service.send_codes(current_user.id, data.account_ids)
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 @router.post(
     '/{account_id}/send-code/',
     response_model=SendCodeOut,
@@ -131,3 +179,21 @@ async def unlaunch(request: Request, account_id: int, client_manager: ClientMana
     except Exception as e:
         logger.error(e)
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+@router.post(
+    '/{account_id}/sync-channels/',
+    status_code=status.HTTP_200_OK,
+    summary="Sync account channels now"
+)
+async def sync_channels(request: Request, account_id: int, client_manager: ClientManager = Depends(get_client_manager)):
+    current_user: UserModel = request.state.user
+    try:
+        changed = await service.sync_channels(current_user.id, account_id, client_manager)
+        return JSONResponse(status_code=status.HTTP_200_OK, content={'msg': 'ok', 'changed': changed})
+    except PermissionDeniedError as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -2,8 +2,11 @@ from typing import List
 
 from fastapi import APIRouter, Depends, status, Query, HTTPException
 
-from app.api.deps import require_admin_role, logger
+from app.api.deps import require_admin_role, logger, get_client_manager
+from app.core.telegram_client import ClientManager
 from app.schemas.common import Pagination, PageResponse
+from app.schemas.media import UploadCacheStatsOut
+from app.schemas.proxy import ProxyStatsOut
 from app.schemas.user import UserResponse, UserCreate, UserFilter
 from app.services.user import UserService
 
@@ -42,3 +45,26 @@ async def read_users(
 @router.get('/users/{user_id}/', response_model=UserResponse, status_code=status.HTTP_200_OK, summary='获取单个用户信息')
 async def read_user(user_id: int):
     return await service.get_user_by_id(user_id)
+
+
+@router.get('/proxies/', response_model=List[ProxyStatsOut], status_code=status.HTTP_200_OK, summary='获取代理池状态')
+async def read_proxies(client_manager: ClientManager = Depends(get_client_manager)):
+    try:
+        return await client_manager.proxy_stats()
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get(
+    '/upload-cache/',
+    response_model=UploadCacheStatsOut,
+    status_code=status.HTTP_200_OK,
+    summary='获取媒体上传缓存命中统计'
+)
+async def read_upload_cache_stats(client_manager: ClientManager = Depends(get_client_manager)):
+    try:
+        return await client_manager.upload_stats()
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
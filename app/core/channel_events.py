@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Tuple
+
+from telethon import TelegramClient, events, types, functions, errors, utils
+
+from app.crud.account import AccountCRUD
+from app.crud.account_channel import AccountChannelCRUD
+from app.exceptions import RateLimitedError
+from .system_schedules import sync_channels_to_db, download_channel_photos
+from .telegram_client import ClientManager
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelEventSync:
+    """
+    接收更新的账号收到 UpdateChannel(创建、标题、头像、用户名、管理员权限变化)时,
+    只拉取该频道并更新数据库; 同一频道在 delay 秒内的多次更新合并为一次.
+    """
+
+    def __init__(self, client_manager: ClientManager, delay: float = 1.0):
+        self.client_manager = client_manager
+        self.delay = delay
+        self._pending: set[Tuple[str, int]] = set()
+        # 持有后台同步任务的引用, 避免任务在运行中被回收
+        self._tasks: set[asyncio.Task] = set()
+
+    def attach(self, session_name: str, client: TelegramClient):
+        if session_name not in self.client_manager.update_receivers:
+            return
+
+        async def on_channel_update(update: types.UpdateChannel):
+            self.schedule(session_name, update.channel_id)
+
+        client.add_event_handler(on_channel_update, events.Raw(types.UpdateChannel))
+
+    def schedule(self, session_name: str, channel_id: int):
+        key = (session_name, channel_id)
+        if key in self._pending:
+            return
+        self._pending.add(key)
+        task = asyncio.create_task(self._sync_later(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _sync_later(self, key: Tuple[str, int]):
+        await asyncio.sleep(self.delay)
+        self._pending.discard(key)
+        session_name, channel_id = key
+        try:
+            await self.sync_channel(session_name, channel_id)
+        except RateLimitedError as e:
+            logger.warning(f'{session_name} 同步频道 {channel_id} 被限流, 等待下次全量校对: {e}')
+        except Exception as e:
+            logger.error(f'{session_name} 同步频道 {channel_id} 失败: {e}')
+
+    async def sync_channel(self, session_name: str, channel_id: int):
+        account = await AccountCRUD().get_by_session_name(session_name)
+        if account is None:
+            return
+
+        peer_cache = self.client_manager.peer_cache
+        async with self.client_manager.get_client(session_name, method='GetChannelsRequest') as client:
+            input_channel = peer_cache.input_channel(session_name, channel_id)
+            if input_channel is None:
+                input_channel = utils.get_input_channel(await client.get_input_entity(types.PeerChannel(channel_id)))
+            try:
+                result = await client(functions.channels.GetChannelsRequest([input_channel]))
+                channel = result.chats[0] if result.chats else None
+            except (errors.ChannelPrivateError, errors.ChannelInvalidError):
+                channel = None
+
+        if isinstance(channel, types.Channel) and channel.broadcast and channel.admin_rights:
+            peer_cache.put(session_name, channel.id, channel.access_hash)
+            photos, _ = await download_channel_photos(self.client_manager, session_name, [channel])
+            await sync_channels_to_db([channel], account.user_id, account.id, photos)
+            logger.info(f'{session_name} 已同步频道 {channel.id} - {channel.title}')
+            return
+
+        # 已不是管理员或频道已不可访问
+        peer_cache.invalidate(session_name, channel_id)
+        if await AccountChannelCRUD().delete_by_account_id_and_channel_tid(account.id, channel_id):
+            logger.info(f'{session_name} 已不再管理频道 {channel_id}, 已移除关联')
+
+
+def setup_channel_events(client_manager: ClientManager) -> ChannelEventSync:
+    channel_events = ChannelEventSync(client_manager)
+    client_manager.add_connect_hook(channel_events.attach)
+    return channel_events
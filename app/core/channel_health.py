@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from telethon import types, functions, errors
+
+from app.core.config import settings
+from app.crud.account import AccountCRUD
+from app.crud.account_channel import AccountChannelCRUD
+from app.crud.channel import ChannelCRUD
+from app.db.models import AccountModel
+from app.exceptions import RateLimitedError
+from .telegram_client import ClientManager
+
+logger = logging.getLogger(__name__)
+
+# channels.getChannels 单次最多查询的频道数
+HEALTH_CHUNK_SIZE = 100
+
+
+def restriction_text(channel: types.Channel) -> str | None:
+    if not channel.restriction_reason:
+        return None
+    return '; '.join(f'{item.platform}/{item.reason}: {item.text}' for item in channel.restriction_reason)
+
+
+def is_restricted_everywhere(channel: types.Channel) -> bool:
+    # restricted 也可能只针对某个平台(如 ios), 这类频道仍可正常发布, 只有对所有平台生效的限制才视为封禁
+    return any(item.platform == 'all' for item in channel.restriction_reason or [])
+
+
+async def fetch_channels(
+        client_manager: ClientManager,
+        session_name: str,
+        input_channels: List[types.InputChannel],
+) -> Dict[int, types.TypeChat]:
+    """
+    批量查询频道; 其中一个频道无效会导致整批失败, 此时二分找出无效的频道, 它们不会出现在结果中.
+    二分产生的每次请求同样经过限流, 被限流时等待后继续, 已查到的部分不会丢失.
+    """
+    while True:
+        try:
+            async with client_manager.get_client(session_name, method='GetChannelsRequest') as client:
+                result = await client(functions.channels.GetChannelsRequest(input_channels))
+            break
+        except RateLimitedError as e:
+            logger.info(f'{session_name} 频道健康检查被限流, 等待 {e.seconds:.0f} 秒后继续')
+            await asyncio.sleep(e.seconds)
+        except (errors.ChannelInvalidError, errors.ChannelPrivateError):
+            if len(input_channels) == 1:
+                return {}
+            middle = len(input_channels) // 2
+            return {
+                **await fetch_channels(client_manager, session_name, input_channels[:middle]),
+                **await fetch_channels(client_manager, session_name, input_channels[middle:]),
+            }
+    return {chat.id: chat for chat in result.chats}
+
+
+async def check_account_channels(client_manager: ClientManager, account: AccountModel) -> Tuple[int, int]:
+    """
+    每 100 个频道一次 GetChannelsRequest, 更新频道的封禁状态/限制原因以及账号在频道中的管理员权限,
+    只批量写回有变化的行; 返回检查的频道数与不可用的频道数.
+    """
+    links = await AccountChannelCRUD().list_with_channel_by_account_id(account.id)
+    changed_channels, changed_links = [], []
+    checked = unhealthy = 0
+
+    for start in range(0, len(links), HEALTH_CHUNK_SIZE):
+        chunk = links[start:start + HEALTH_CHUNK_SIZE]
+        chats = await fetch_channels(
+            client_manager,
+            account.session_name,
+            [types.InputChannel(link.channel.tid, link.access_hash) for link in chunk],
+        )
+
+        for link in chunk:
+            channel = link.channel
+            chat = chats.get(channel.tid)
+            if isinstance(chat, types.Channel):
+                is_banned, reason = is_restricted_everywhere(chat), restriction_text(chat)
+                admin_rights = (
+                    {key: value for key, value in chat.admin_rights.to_dict().items() if key != '_'}
+                    if chat.admin_rights else None
+                )
+                is_accessible = bool(chat.creator or chat.admin_rights)
+            elif isinstance(chat, types.ChannelForbidden):
+                is_banned, reason = True, channel.restriction_reason
+                admin_rights, is_accessible = None, False
+            else:
+                # 频道已失效: 只影响当前账号与频道的关联
+                is_banned, reason = channel.is_banned, channel.restriction_reason
+                admin_rights, is_accessible = None, False
+
+            if (channel.is_banned, channel.restriction_reason) != (is_banned, reason):
+                channel.is_banned, channel.restriction_reason = is_banned, reason
+                changed_channels.append(channel)
+            if (link.admin_rights, link.is_accessible) != (admin_rights, is_accessible):
+                link.admin_rights, link.is_accessible = admin_rights, is_accessible
+                changed_links.append(link)
+
+            checked += 1
+            unhealthy += is_banned or not is_accessible
+
+    await ChannelCRUD().bulk_update_health(changed_channels)
+    await AccountChannelCRUD().bulk_update_health(changed_links)
+    return checked, unhealthy
+
+
+async def process_channel_health(client_manager: ClientManager):
+    accounts = [
+        account for account in await AccountCRUD().list_online()
+        if client_manager.owns(account.session_name)
+    ]
+    semaphore = asyncio.Semaphore(settings.CHANNEL_SYNC_CONCURRENCY)
+
+    async def check_one(account: AccountModel) -> Tuple[int, int]:
+        async with semaphore:
+            try:
+                return await check_account_channels(client_manager, account)
+            except Exception as e:
+                logger.error(f'{account.session_name} 频道健康检查失败: {e}')
+                return 0, 0
+
+    results = await asyncio.gather(*[check_one(account) for account in accounts])
+    logger.info(
+        f'频道健康检查完成: 检查 {sum(checked for checked, _ in results)} 个, '
+        f'不可用 {sum(unhealthy for _, unhealthy in results)} 个'
+    )
@@ -0,0 +1,50 @@
+from typing import Callable, Dict, List
+
+from app.constants.enum import AccountRole
+from app.crud.account_channel import AccountChannelCRUD
+from app.db.models import AccountChannelModel
+from .telegram_client import ClientManager
+
+
+def is_usable(link: AccountChannelModel) -> bool:
+    return link.is_accessible and not link.channel.is_banned
+
+
+def can_add_admins(link: AccountChannelModel) -> bool:
+    return is_usable(link) and (
+        link.role == AccountRole.OWNER or bool((link.admin_rights or {}).get('add_admins'))
+    )
+
+
+async def route_channel_links(
+        client_manager: ClientManager,
+        channel_ids: List[int],
+        eligible: Callable[[AccountChannelModel], bool] = is_usable,
+) -> Dict[int, AccountChannelModel]:
+    """
+    为每个频道从其管理账号中选出负载评分最低的一个; 同一批中每分配一个频道, 该账号的评分加 1, 使负载分散到多个账号.
+    没有符合条件的账号时返回任一关联, 由调用方判断后跳过; 没有任何关联的频道不在结果中.
+    """
+    links_by_channel: Dict[int, List[AccountChannelModel]] = {}
+    for link in await AccountChannelCRUD().list_with_channel_account_by_channel_ids(channel_ids):
+        links_by_channel.setdefault(link.channel_id, []).append(link)
+
+    session_names = sorted({
+        link.account.session_name for links in links_by_channel.values() for link in links if eligible(link)
+    })
+    loads = await client_manager.load_scores(session_names) if session_names else {}
+
+    routed: Dict[int, AccountChannelModel] = {}
+    for channel_id in channel_ids:
+        links = links_by_channel.get(channel_id)
+        if not links:
+            continue
+        candidates = [link for link in links if eligible(link)]
+        if not candidates:
+            routed[channel_id] = links[0]
+            continue
+
+        best = min(candidates, key=lambda link: (loads[link.account.session_name], -link.account.health_score))
+        loads[best.account.session_name] += 1
+        routed[channel_id] = best
+    return routed
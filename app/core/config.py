@@ -12,6 +12,9 @@ class Settings(BaseSettings):
     BASE_DIR: Path = BASE_DIR
 
     TELEGRAM_SESSIONS_ROOT: Path = BASE_DIR / "sessions"
+    # 会话存储后端: sqlite(每个账号一个 .session 文件) / database(写入数据库) / memory(内存中维护, 定期批量写入数据库)
+    TELEGRAM_SESSION_BACKEND: str = 'sqlite'
+    TELEGRAM_SESSION_CHECKPOINT_INTERVAL: int = 60
 
     LOG_LEVEL: str = 'INFO'
 
@@ -26,6 +29,12 @@ class Settings(BaseSettings):
 
     ENABLE_PROXY: bool
     PROXY: Tuple[str, str, int, str, str]
+    # 代理池: 配置后替代单个 PROXY; 每个代理最多绑定的账号数(0 表示不限制)、连续失败多少次视为不可用、健康检查间隔
+    PROXY_POOL: List[Tuple[str, str, int, str, str]] = []
+    PROXY_MAX_CONNECTIONS: int = 0
+    PROXY_MAX_ERRORS: int = 3
+    PROXY_HEALTH_CHECK_INTERVAL: int = 30
+    PROXY_PROBE_TIMEOUT: float = 5
 
     TOKEN_SECRET_KEY: str
     TOKEN_ALGORITHM: str
@@ -37,8 +46,76 @@ class Settings(BaseSettings):
     ALLOWED_VIDEO_TYPES: List[str] = ['video/mp4']
     VIDEO_MAX_SIZE: int = 100 * 1024 * 1024
     IMG_MAX_SIZE: int = 15 * 1024 * 1024
+    # 同一账号重复使用已上传文件(InputFile)的有效期(秒), 超过后重新上传
+    UPLOAD_CACHE_TTL: int = 1800
+    # 分片上传: 每个分片大小(KB, 需整除 512)及同时上传的分片数
+    UPLOAD_PART_SIZE_KB: int = 512
+    UPLOAD_CONCURRENCY: int = 8
 
     TASK_INTERVAL_TIME: int = 5
+    # 频道同步: 不接收更新的账号各自按间隔轮询(分钟), 频道有变化时缩短、无变化时拉长, 限制在最小/最大值之间;
+    # 以及所有账号全量校对的间隔(分钟)
+    CHANNEL_SYNC_INTERVAL: int = 10
+    CHANNEL_SYNC_MIN_INTERVAL: int = 5
+    CHANNEL_SYNC_MAX_INTERVAL: int = 120
+    CHANNEL_RECONCILE_INTERVAL: int = 360
+    # 同时同步频道的账号数
+    CHANNEL_SYNC_CONCURRENCY: int = 10
+    # 频道健康(封禁/限制/管理员权限)检查间隔(分钟)
+    CHANNEL_HEALTH_INTERVAL: int = 60
+    PUBLISH_WORKERS: int = 4
+    # 预先验证可用的用户名池: 池大小、补充间隔(秒)、验证结果的有效期(秒), 以及记录已占用用户名的布隆过滤器容量
+    USERNAME_POOL_SIZE: int = 50
+    USERNAME_POOL_REFILL_INTERVAL: int = 60
+    USERNAME_POOL_TTL: int = 3600
+    USERNAME_TAKEN_CAPACITY: int = 100000
+    # 同一账号的频道修改任务合并为一个 MTProto 容器发送, 每批最多的请求数(不超过 RATE_LIMIT_BURST)
+    TASK_BATCH_SIZE: int = 10
+
+    ACCOUNT_LAUNCH_CONCURRENCY: int = 20
+    ACCOUNT_LAUNCH_TIMEOUT: int = 30
+
+    # 发送验证码后等待 sign_in 的客户端保留时间(秒), 以及批量发送验证码的并发数
+    LOGIN_PENDING_TTL: int = 300
+    LOGIN_BATCH_CONCURRENCY: int = 10
+    # 批量导入会话时同时校验的账号数
+    SESSION_IMPORT_CONCURRENCY: int = 50
+
+    # 每个账号允许同时进行的请求数, 以及需要独占账号的操作类型(如 'upload')
+    CLIENT_CONCURRENCY_PER_ACCOUNT: int = 4
+    CLIENT_EXCLUSIVE_OPERATIONS: List[str] = []
+
+    # 每个 (账号, RPC方法) 的令牌桶: 每秒补充的令牌数、桶容量, 以及遭遇 FloodWait 后允许降到的最低速率
+    RATE_LIMIT_RATE: float = 0.5
+    RATE_LIMIT_BURST: int = 5
+    RATE_LIMIT_MIN_RATE: float = 0.01
+    # 账号健康分: 指数加权平均系数, 以及单次调用视为过慢的耗时(毫秒)
+    ACCOUNT_HEALTH_ALPHA: float = 0.1
+    ACCOUNT_HEALTH_SLOW_MS: float = 5000
+    # 健康分低于该值时暂停使用账号的时长(秒)
+    ACCOUNT_HEALTH_COOLDOWN_SCORE: float = 0.5
+    ACCOUNT_HEALTH_COOLDOWN: int = 600
+    # 健康分低于该值时自动下线, 服务重启时也不会自动上线, 需手动上线
+    ACCOUNT_HEALTH_OFFLINE_SCORE: float = 0.2
+    # 频道有多个管理账号时按负载选择账号: 健康分每降低 1 相当于多排队的任务数
+    CHANNEL_ROUTING_HEALTH_WEIGHT: float = 10
+
+    # 按需连接模式: 账号上线时只登记, 首次使用时才连接; 空闲超过 TTL 的客户端会被断开,
+    # 常驻客户端数量超过上限时按最近最少使用淘汰(0 表示不限制)
+    CLIENT_LAZY_CONNECT: bool = False
+    CLIENT_IDLE_TTL: int = 600
+    CLIENT_MAX_RESIDENT: int = 0
+    CLIENT_REAP_INTERVAL: int = 60
+
+    # 连接监督: 巡检间隔, 以及断线重连的指数退避起始/最大间隔(秒)
+    CLIENT_SUPERVISOR_INTERVAL: int = 15
+    CLIENT_RECONNECT_BASE_DELAY: float = 5
+    CLIENT_RECONNECT_MAX_DELAY: float = 600
+
+    # 多进程引擎: 大于 1 时账号按哈希分配到多个子进程, 每个子进程各自维护 ClientManager、队列和系统定时任务
+    ENGINE_SHARDS: int = 0
+    ENGINE_SOCKET_DIR: Path = BASE_DIR / 'run'
+    ENGINE_START_TIMEOUT: int = 60
 
     AI_API_KEY: str
     AI_API_URL: str
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from app.core.config import settings
+from app.core.scheduler import setup_scheduler
+from app.db.register import connect_to_db, close_db_connection
+from app.task.workers import start_workers
+from .channel_events import setup_channel_events
+from .session_storage import session_store
+from .status_sync import launch_accounts, unlaunch_accounts, stop_system_schedules
+from .system_schedules import add_system_schedules
+from .telegram_client import ClientManager, setup_client_manager, shard_of
+from .username_pool import username_pool
+
+logger = logging.getLogger(__name__)
+
+
+async def start_runtime(client_manager: ClientManager, scheduler: AsyncIOScheduler) -> List[asyncio.Task]:
+    """上线账号并启动连接监督、系统定时任务和队列 worker, 单进程模式与每个分片子进程共用"""
+    setup_channel_events(client_manager)
+    await launch_accounts(client_manager)
+    client_manager.start_idle_reaper(settings.CLIENT_REAP_INTERVAL)
+    client_manager.start_supervisor(settings.CLIENT_SUPERVISOR_INTERVAL, settings.ACCOUNT_LAUNCH_TIMEOUT)
+    if client_manager.proxy_pool:
+        client_manager.proxy_pool.start_health_checks(
+            settings.PROXY_HEALTH_CHECK_INTERVAL,
+            settings.PROXY_PROBE_TIMEOUT,
+        )
+
+    await add_system_schedules(scheduler, client_manager)
+    username_pool.start(client_manager, settings.USERNAME_POOL_REFILL_INTERVAL)
+
+    return start_workers(client_manager)
+
+
+async def stop_runtime(client_manager: ClientManager, scheduler: AsyncIOScheduler, workers: List[asyncio.Task]):
+    for worker in workers:
+        worker.cancel()
+    username_pool.stop()
+    client_manager.stop_idle_reaper()
+    await client_manager.stop_supervisor()
+    if client_manager.proxy_pool:
+        client_manager.proxy_pool.stop_health_checks()
+    await stop_system_schedules(scheduler)
+    await unlaunch_accounts(client_manager)
+
+
+def shard_socket_path(index: int) -> Path:
+    return settings.ENGINE_SOCKET_DIR / f'engine-{index}.sock'
+
+
+class ShardServer:
+    """
+    分片子进程内的本地 IPC 服务, 每行一个 JSON 请求/响应, 以请求 id 对应;
+    同一连接上的请求并发处理, 耗时的操作(如同步频道)不会阻塞其他请求.
+    """
+
+    def __init__(self, client_manager: ClientManager):
+        self.client_manager = client_manager
+        self.stopped = asyncio.Event()
+
+    async def dispatch(self, op: str, args: Dict[str, Any]) -> Any:
+        if op == 'is_online':
+            return await self.client_manager.is_online(args['session_name'])
+        if op == 'launch_client':
+            return await self.client_manager.launch_client(
+                args['session_name'], args.get('timeout'), args.get('receive_updates', False)
+            )
+        if op == 'remove_client':
+            return await self.client_manager.remove_client(args['session_name'])
+        if op == 'flush_liveness':
+            return await self.client_manager.flush_liveness()
+        if op == 'proxy_stats':
+            return await self.client_manager.proxy_stats()
+        if op == 'upload_stats':
+            return await self.client_manager.upload_stats()
+        if op == 'sync_channels':
+            return await self.client_manager.sync_channels(args['session_name'])
+        if op == 'load_scores':
+            return await self.client_manager.load_scores(args['session_names'])
+        if op == 'enqueue':
+            return await self.client_manager.enqueue(args['queue_name'], args['session_name'], args['task_data'])
+        if op == 'shutdown':
+            self.stopped.set()
+            return None
+        raise ValueError(f'不支持的操作: {op}')
+
+    async def respond(self, request: Dict[str, Any], writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        try:
+            response = {'id': request['id'], 'result': await self.dispatch(request['op'], request.get('args') or {})}
+        except Exception as e:
+            response = {'id': request['id'], 'error': str(e)}
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        pending: set[asyncio.Task] = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.respond(json.loads(line), writer, write_lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+
+async def serve_shard(index: int, shards: int):
+    await connect_to_db()
+    session_store.start()
+
+    client_manager = await setup_client_manager(shard=(index, shards))
+    server = ShardServer(client_manager)
+
+    socket_path = shard_socket_path(index)
+    socket_path.unlink(missing_ok=True)
+    unix_server = await asyncio.start_unix_server(server.handle, path=str(socket_path))
+
+    scheduler = setup_scheduler()
+    scheduler.start()
+    workers = await start_runtime(client_manager, scheduler)
+    logger.info(f'引擎分片 {index}/{shards} 已启动')
+
+    await server.stopped.wait()
+
+    unix_server.close()
+    await stop_runtime(client_manager, scheduler, workers)
+    scheduler.shutdown()
+    await session_store.stop()
+    await close_db_connection()
+    socket_path.unlink(missing_ok=True)
+    logger.info(f'引擎分片 {index}/{shards} 已停止')
+
+
+def run_shard(index: int, shards: int):
+    from app.core.logging_config import setup_logging
+
+    setup_logging()
+    asyncio.run(serve_shard(index, shards))
+
+
+class ShardConnection:
+    """
+    到一个分片的多路复用连接: 每个请求带自增 id, 由后台读取任务按 id 把响应交给对应的 Future,
+    多个请求可以同时在途, 调用方被取消也不会让后续请求读到错位的响应.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.write_lock = asyncio.Lock()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._reader_task: asyncio.Task | None = None
+
+    async def connect(self, timeout: float):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(str(shard_socket_path(self.index)))
+                self._reader_task = asyncio.create_task(self._read_responses())
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if asyncio.get_running_loop().time() > deadline:
+                    raise TimeoutError(f'引擎分片 {self.index} 启动超时')
+                await asyncio.sleep(0.5)
+
+    async def _read_responses(self):
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                future = self.pending.pop(response['id'], None)
+                # 调用方已被取消时直接丢弃响应
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(RuntimeError(response['error']))
+                else:
+                    future.set_result(response['result'])
+        finally:
+            pending, self.pending = self.pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f'引擎分片 {self.index} 连接已断开'))
+
+    async def request(self, op: str, **args) -> Any:
+        if self._reader_task is None or self._reader_task.done():
+            raise ConnectionError(f'引擎分片 {self.index} 连接已断开')
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            async with self.write_lock:
+                self.writer.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b'\n')
+                await self.writer.drain()
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class EngineProxy:
+    """
+    API 进程中代替 ClientManager 的轻量代理: 按会话名哈希把调用转发到负责该账号的分片子进程.
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        self.processes: List[multiprocessing.Process] = []
+        self.connections = [ShardConnection(index) for index in range(shards)]
+
+    async def start(self):
+        settings.ENGINE_SOCKET_DIR.mkdir(parents=True, exist_ok=True)
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.shards):
+            process = context.Process(target=run_shard, args=(index, self.shards), name=f'tennel-engine-{index}')
+            process.start()
+            self.processes.append(process)
+
+        await asyncio.gather(*[conn.connect(settings.ENGINE_START_TIMEOUT) for conn in self.connections])
+        logger.info(f'已启动 {self.shards} 个引擎分片')
+
+    async def stop(self):
+        for conn in self.connections:
+            try:
+                await conn.request('shutdown')
+            except Exception as e:
+                logger.error(f'关闭引擎分片 {conn.index} 失败: {e}')
+            await conn.close()
+
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, settings.ENGINE_START_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+    def connection_for(self, session_name: str) -> ShardConnection:
+        return self.connections[shard_of(session_name, self.shards)]
+
+    def owns(self, session_name: str) -> bool:
+        return False
+
+    async def is_online(self, session_name: str) -> bool:
+        return await self.connection_for(session_name).request('is_online', session_name=session_name)
+
+    async def launch_client(
+            self,
+            session_name: str,
+            timeout: float | None = None,
+            receive_updates: bool = False,
+    ) -> bool:
+        return await self.connection_for(session_name).request(
+            'launch_client', session_name=session_name, timeout=timeout, receive_updates=receive_updates
+        )
+
+    async def remove_client(self, session_name: str):
+        await self.connection_for(session_name).request('remove_client', session_name=session_name)
+
+    async def flush_liveness(self):
+        await asyncio.gather(*[conn.request('flush_liveness') for conn in self.connections])
+
+    async def proxy_stats(self) -> List[Dict]:
+        results = await asyncio.gather(*[conn.request('proxy_stats') for conn in self.connections])
+        return [{**item, 'shard': conn.index} for conn, items in zip(self.connections, results) for item in items]
+
+    async def sync_channels(self, session_name: str) -> int:
+        return await self.connection_for(session_name).request('sync_channels', session_name=session_name)
+
+    async def upload_stats(self) -> Dict[str, int]:
+        results = await asyncio.gather(*[conn.request('upload_stats') for conn in self.connections])
+        return {key: sum(item[key] for item in results) for key in results[0]}
+
+    async def load_scores(self, session_names: List[str]) -> Dict[str, float]:
+        groups: Dict[int, List[str]] = {}
+        for name in session_names:
+            groups.setdefault(shard_of(name, self.shards), []).append(name)
+        results = await asyncio.gather(*[
+            self.connections[index].request('load_scores', session_names=names) for index, names in groups.items()
+        ])
+        return {name: score for result in results for name, score in result.items()}
+
+    async def enqueue(self, queue_name: str, session_name: str, task_data: Tuple | List):
+        await self.connection_for(session_name).request(
+            'enqueue', queue_name=queue_name, session_name=session_name, task_data=list(task_data)
+        )
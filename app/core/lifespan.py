@@ -1,19 +1,15 @@
-import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from app.core.config import settings
 from app.core.scheduler import setup_scheduler
 from app.db.register import connect_to_db, close_db_connection
-from app.task.workers import (
-    create_channel_worker,
-    set_channel_username_worker,
-    set_channel_photo_worker,
-    set_channel_description_worker
-)
-from .status_sync import launch_accounts, stop_schedules, unlaunch_accounts, stop_tasks
-from .system_schedules import add_system_schedules
+from .engine import EngineProxy, start_runtime, stop_runtime
+from .pending_login import pending_logins
+from .status_sync import stop_schedules, stop_tasks
+from .session_storage import session_store
 from .telegram_client import setup_client_manager
 
 logger = logging.getLogger(__name__)
@@ -25,21 +21,23 @@ async def lifespan(app: FastAPI):
 
     await connect_to_db()
 
-    client_manager = await setup_client_manager()
-
-    await launch_accounts(client_manager)
-
     scheduler = setup_scheduler()
+    pending_logins.start()
+    # 发送验证码和登录始终在 API 进程中进行, 引擎模式下同样需要写回新登录账号的会话
+    session_store.start()
+
+    workers = []
+    if settings.ENGINE_SHARDS > 1:
+        # 账号、队列和系统定时任务都在分片子进程中运行, API 进程只保留代理和用户定时任务
+        client_manager = EngineProxy(settings.ENGINE_SHARDS)
+        await client_manager.start()
+    else:
+        client_manager = await setup_client_manager()
+        workers = await start_runtime(client_manager, scheduler)
+
     logger.info('正在启动定时任务管理器...')
     scheduler.start()
 
-    await add_system_schedules(scheduler, client_manager)
-
-    asyncio.create_task(create_channel_worker())
-    asyncio.create_task(set_channel_username_worker())
-    asyncio.create_task(set_channel_photo_worker())
-    asyncio.create_task(set_channel_description_worker())
-
     app.state.client_manager = client_manager
     app.state.scheduler = scheduler
 
@@ -48,8 +46,13 @@ async def lifespan(app: FastAPI):
     yield
 
     await stop_schedules(app.state.scheduler)
-    await unlaunch_accounts(app.state.client_manager)
+    if isinstance(app.state.client_manager, EngineProxy):
+        await app.state.client_manager.stop()
+    else:
+        await stop_runtime(app.state.client_manager, app.state.scheduler, workers)
     await stop_tasks()
+    await pending_logins.stop()
+    await session_store.stop()
 
     logger.info('正在关闭定时任务管理器...')
     app.state.scheduler.shutdown()
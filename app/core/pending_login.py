@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from telethon import TelegramClient
+
+from app.core.config import settings
+from app.core.telegram_client import disconnect_static_client
+
+logger = logging.getLogger(__name__)
+
+
+class PendingLogin:
+    def __init__(self, client: TelegramClient, phone_code_hash: str, expires_at: float):
+        self.client = client
+        self.phone_code_hash = phone_code_hash
+        self.expires_at = expires_at
+
+
+class PendingLoginManager:
+    """
+    保存已发送验证码、等待 sign_in 的客户端, sign_in 时直接复用同一个连接,
+    超过 ttl 秒未完成登录的客户端会被断开.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._pending: Dict[str, PendingLogin] = {}
+        self._sweeper_task: asyncio.Task | None = None
+
+    @staticmethod
+    async def _disconnect(phone: str, client: TelegramClient, release_proxy: bool = True):
+        try:
+            if release_proxy:
+                await disconnect_static_client(client, phone)
+            elif client.is_connected():
+                await client.disconnect()
+        except Exception as e:
+            logger.error(f'断开待登录客户端失败: {e}')
+
+    async def put(self, phone: str, client: TelegramClient, phone_code_hash: str):
+        previous = self._pending.pop(phone, None)
+        self._pending[phone] = PendingLogin(client, phone_code_hash, time.monotonic() + self.ttl)
+        if previous is not None and previous.client is not client:
+            # 新客户端仍使用同一手机号的代理名额, 不释放
+            await self._disconnect(phone, previous.client, release_proxy=False)
+
+    async def pop(self, phone: str, phone_code_hash: str) -> TelegramClient | None:
+        """取出与 phone_code_hash 匹配且未过期的客户端, 取出后由调用方负责断开"""
+        pending = self._pending.get(phone)
+        if pending is None or pending.phone_code_hash != phone_code_hash:
+            return None
+        del self._pending[phone]
+        if pending.expires_at < time.monotonic():
+            await self._disconnect(phone, pending.client)
+            return None
+        return pending.client
+
+    async def expire(self):
+        now = time.monotonic()
+        expired = [phone for phone, pending in self._pending.items() if pending.expires_at < now]
+        for phone in expired:
+            await self._disconnect(phone, self._pending.pop(phone).client)
+        if expired:
+            logger.info(f'已断开 {len(expired)} 个超时未登录的客户端')
+
+    async def _expire_forever(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            await self.expire()
+
+    def start(self, interval: int = 60):
+        if self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._expire_forever(interval))
+
+    async def stop(self):
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            self._sweeper_task = None
+        pending, self._pending = self._pending, {}
+        await asyncio.gather(*[self._disconnect(phone, item.client) for phone, item in pending.items()])
+
+
+pending_logins = PendingLoginManager(settings.LOGIN_PENDING_TTL)
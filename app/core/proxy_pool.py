@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Tuple, Any
+
+from app.core.config import settings
+from app.exceptions import ProxyUnavailableError
+
+logger = logging.getLogger(__name__)
+
+ProxyInfo = Tuple[str, str, int, str, str]
+
+
+class ProxyState:
+    def __init__(self, proxy: ProxyInfo):
+        self.proxy = proxy
+        self.sessions: set[str] = set()
+        self.healthy = True
+        self.latency_ms: float | None = None
+        self.successes = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_checked_at: float | None = None
+
+    @property
+    def host(self) -> str:
+        return self.proxy[1]
+
+    @property
+    def port(self) -> int:
+        return self.proxy[2]
+
+    @property
+    def name(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    def record_latency(self, latency_ms: float):
+        # 指数加权平均, 平滑单次探测的抖动
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = self.latency_ms * 0.7 + latency_ms * 0.3
+
+
+class ProxyPool:
+    """
+    账号粘性绑定到某个代理; 首次分配或原代理不可用时选择负载最低的健康代理,
+    单个代理绑定的账号数不超过 max_connections (0 表示不限制).
+    """
+
+    def __init__(self, proxies: List[ProxyInfo], max_connections: int = 0, max_errors: int = 3):
+        self.proxies = [ProxyState(proxy) for proxy in proxies]
+        self.max_connections = max_connections
+        self.max_errors = max_errors
+        self.assignments: Dict[str, ProxyState] = {}
+        self._health_task: asyncio.Task | None = None
+
+    def _has_capacity(self, state: ProxyState) -> bool:
+        return not self.max_connections or len(state.sessions) < self.max_connections
+
+    def assign(self, session_name: str) -> ProxyInfo:
+        state = self.assignments.get(session_name)
+        if state is not None and state.healthy:
+            return state.proxy
+
+        candidates = [item for item in self.proxies if item.healthy and self._has_capacity(item)]
+        if not candidates:
+            raise ProxyUnavailableError('没有可用的代理')
+
+        best = min(candidates, key=lambda item: (len(item.sessions), item.latency_ms or 0))
+        self.release(session_name)
+        best.sessions.add(session_name)
+        self.assignments[session_name] = best
+        if state is not None:
+            logger.warning(f'{session_name} 的代理 {state.name} 不可用, 已切换到 {best.name}')
+        return best.proxy
+
+    def release(self, session_name: str):
+        state = self.assignments.pop(session_name, None)
+        if state is not None:
+            state.sessions.discard(session_name)
+
+    def record_success(self, session_name: str):
+        state = self.assignments.get(session_name)
+        if state is not None:
+            state.successes += 1
+            state.consecutive_errors = 0
+
+    def record_error(self, session_name: str):
+        state = self.assignments.get(session_name)
+        if state is None:
+            return
+        state.errors += 1
+        state.consecutive_errors += 1
+        if state.healthy and state.consecutive_errors >= self.max_errors:
+            state.healthy = False
+            logger.warning(f'代理 {state.name} 连续失败 {state.consecutive_errors} 次, 标记为不可用')
+
+    async def probe(self, state: ProxyState, timeout: float):
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(state.host, state.port), timeout)
+            writer.close()
+            await writer.wait_closed()
+        except Exception as e:
+            state.errors += 1
+            if state.healthy:
+                logger.warning(f'代理 {state.name} 健康检查失败: {e}')
+            state.healthy = False
+        else:
+            state.record_latency((time.perf_counter() - start) * 1000)
+            if not state.healthy:
+                logger.info(f'代理 {state.name} 已恢复')
+            state.healthy = True
+            state.consecutive_errors = 0
+        state.last_checked_at = time.time()
+
+    async def check_health(self, timeout: float):
+        await asyncio.gather(*[self.probe(state, timeout) for state in self.proxies])
+
+    async def _check_health_forever(self, interval: int, timeout: float):
+        while True:
+            await self.check_health(timeout)
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval: int, timeout: float):
+        if self._health_task is None and self.proxies:
+            self._health_task = asyncio.create_task(self._check_health_forever(interval, timeout))
+
+    def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                'proxy': state.name,
+                'healthy': state.healthy,
+                'sessions': len(state.sessions),
+                'max_connections': self.max_connections,
+                'latency_ms': state.latency_ms,
+                'successes': state.successes,
+                'errors': state.errors,
+                'last_checked_at': state.last_checked_at,
+            }
+            for state in self.proxies
+        ]
+
+
+def setup_proxy_pool() -> ProxyPool | None:
+    if not settings.ENABLE_PROXY:
+        return None
+    return ProxyPool(
+        settings.PROXY_POOL or [settings.PROXY],
+        max_connections=settings.PROXY_MAX_CONNECTIONS,
+        max_errors=settings.PROXY_MAX_ERRORS,
+    )
+
+
+proxy_pool = setup_proxy_pool()
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Any, List
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, SQLiteSession, StringSession
+
+from app.core.config import settings
+from app.crud.session import TelegramSessionCRUD
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND_SQLITE = 'sqlite'
+SESSION_BACKEND_DATABASE = 'database'
+SESSION_BACKEND_MEMORY = 'memory'
+
+
+class DatabaseSession(MemorySession):
+    """
+    在内存中维护的 Telethon 会话, 变更后交给 SessionStore 写入数据库,
+    不再为每个账号打开一个 SQLite 文件.
+    """
+
+    def __init__(self, session_name: str, store: 'SessionStore'):
+        super().__init__()
+        self.session_name = session_name
+        self._store = store
+
+    def load(self, data: Dict[str, Any]):
+        if data.get('server_address'):
+            super().set_dc(data['dc_id'], data['server_address'], data['port'])
+        if data.get('auth_key'):
+            self._auth_key = AuthKey(data=bytes(data['auth_key']))
+        self._takeout_id = data.get('takeout_id')
+        self._entities = {tuple(row) for row in data.get('entities') or []}
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            'session_name': self.session_name,
+            'dc_id': self._dc_id,
+            'server_address': self._server_address,
+            'port': self._port,
+            'auth_key': self._auth_key.key if self._auth_key else None,
+            'takeout_id': self._takeout_id,
+            'entities': [list(row) for row in self._entities],
+        }
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self.save()
+
+    @property
+    def auth_key(self):
+        return self._auth_key
+
+    @auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self.save()
+
+    @property
+    def takeout_id(self):
+        return self._takeout_id
+
+    @takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self.save()
+
+    def process_entities(self, tlo):
+        rows = set(self._entities_to_rows(tlo))
+        if rows <= self._entities:
+            return
+        # 与 SQLiteSession 的 insert or replace 一致: 同一 id 只保留最新的 access_hash/用户名
+        ids = {row[0] for row in rows}
+        self._entities = {row for row in self._entities if row[0] not in ids} | rows
+        self.save()
+
+    def save(self):
+        self._store.mark_dirty(self)
+
+    def delete(self):
+        self._store.discard(self.session_name)
+
+
+def read_sqlite_session(session_file: Path, session_name: str | None = None) -> Dict[str, Any]:
+    session = SQLiteSession(str(session_file.with_suffix('')))
+    try:
+        cursor = session._cursor()
+        try:
+            entities = cursor.execute('select id, hash, username, phone, name from entities').fetchall()
+        finally:
+            cursor.close()
+
+        return {
+            'session_name': session_name or session_file.stem,
+            'dc_id': session.dc_id,
+            'server_address': session.server_address,
+            'port': session.port,
+            'auth_key': session.auth_key.key if session.auth_key else None,
+            'takeout_id': session.takeout_id,
+            'entities': [list(row) for row in entities],
+        }
+    finally:
+        session.close()
+
+
+def read_string_session(value: str, session_name: str) -> Dict[str, Any]:
+    session = StringSession(value.strip())
+    return {
+        'session_name': session_name,
+        'dc_id': session.dc_id,
+        'server_address': session.server_address,
+        'port': session.port,
+        'auth_key': session.auth_key.key if session.auth_key else None,
+        'takeout_id': None,
+        'entities': [],
+    }
+
+
+def session_from_data(data: Dict[str, Any]) -> MemorySession:
+    """仅用于校验的临时会话, 不会写回任何存储"""
+    session = MemorySession()
+    session.set_dc(data['dc_id'], data['server_address'], data['port'])
+    if data.get('auth_key'):
+        session.auth_key = AuthKey(data=bytes(data['auth_key']))
+    return session
+
+
+def write_sqlite_session(sessions_root: Path | str, data: Dict[str, Any]):
+    session = SQLiteSession(f'{sessions_root}/{data["session_name"]}')
+    try:
+        session.set_dc(data['dc_id'], data['server_address'], data['port'])
+        session.auth_key = AuthKey(data=bytes(data['auth_key'])) if data.get('auth_key') else None
+        session.save()
+    finally:
+        session.close()
+
+
+class SessionStore:
+    """
+    database 模式下变更在短暂合并后立即写入, memory 模式下按 checkpoint_interval 定期批量写入.
+    """
+
+    def __init__(self, backend: str, checkpoint_interval: int):
+        self.backend = backend
+        self.checkpoint_interval = checkpoint_interval
+        self.crud = TelegramSessionCRUD()
+
+        self._dirty: Dict[str, DatabaseSession] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._checkpoint_task: asyncio.Task | None = None
+
+    @property
+    def uses_database(self) -> bool:
+        return self.backend in (SESSION_BACKEND_DATABASE, SESSION_BACKEND_MEMORY)
+
+    async def build(self, sessions_root: Path | str, session_name: str) -> DatabaseSession | str:
+        """返回可直接传给 TelegramClient 的会话: sqlite 模式为文件路径, 其他模式为从数据库加载的 DatabaseSession"""
+        if not self.uses_database:
+            return f'{sessions_root}/{session_name}'
+
+        session = DatabaseSession(session_name, self)
+        row = await self.crud.get_by_session_name(session_name)
+        if row is not None:
+            session.load({
+                'dc_id': row.dc_id,
+                'server_address': row.server_address,
+                'port': row.port,
+                'auth_key': row.auth_key,
+                'takeout_id': row.takeout_id,
+                'entities': row.entities,
+            })
+        return session
+
+    def mark_dirty(self, session: DatabaseSession):
+        self._dirty[session.session_name] = session
+        if self.backend == SESSION_BACKEND_DATABASE and self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+
+    def discard(self, session_name: str):
+        self._dirty.pop(session_name, None)
+        asyncio.get_running_loop().create_task(self.crud.delete_by_session_name(session_name))
+
+    async def _flush_soon(self):
+        try:
+            await asyncio.sleep(1)
+            await self.flush()
+        finally:
+            self._flush_task = None
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self.crud.bulk_upsert([session.dump() for session in dirty.values()])
+        except Exception as e:
+            logger.error(f'写入 {len(dirty)} 个会话失败, 稍后重试: {e}')
+            for name, session in dirty.items():
+                self._dirty.setdefault(name, session)
+
+    async def save_all(self, sessions_root: Path | str, rows: List[Dict[str, Any]]):
+        """批量写入导入的会话: 数据库模式一次批量写入, sqlite 模式逐个生成 .session 文件"""
+        if self.uses_database:
+            await self.crud.bulk_upsert(rows)
+            return
+
+        def write_all():
+            for row in rows:
+                write_sqlite_session(sessions_root, row)
+
+        await asyncio.to_thread(write_all)
+
+    async def _checkpoint_forever(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.flush()
+
+    def start(self):
+        if self.backend == SESSION_BACKEND_MEMORY and self._checkpoint_task is None:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_forever())
+
+    async def stop(self):
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = None
+        await self.flush()
+
+
+session_store = SessionStore(settings.TELEGRAM_SESSION_BACKEND, settings.TELEGRAM_SESSION_CHECKPOINT_INTERVAL)
@@ -1,25 +1,73 @@
+import asyncio
+import logging
+from typing import List
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.constants.enum import ScheduleStatus, TaskStatus
+from app.core.config import settings
 from app.crud.account import AccountCRUD
 from app.crud.schedule import ScheduleCRUD
 from app.crud.task import TaskCRUD
+from app.db.models import AccountModel
+from .system_schedules import channel_sync
 from .telegram_client import ClientManager
 
+logger = logging.getLogger(__name__)
+
 
 async def launch_accounts(client_manager: ClientManager):
-    authenticated_accounts = await AccountCRUD().list_authenticated()
-    for account in authenticated_accounts:
-        if not await client_manager.is_online(account.session_name):
-            await client_manager.connect_client(account.session_name)
-            await AccountCRUD().update(account.id, {'online': True})
+    authenticated_accounts: List[AccountModel] = [
+        account for account in await AccountCRUD().list_authenticated()
+        if client_manager.owns(account.session_name)
+    ]
+    # 因健康分过低被自动下线的账号需要手动上线
+    healthy = [
+        account for account in authenticated_accounts
+        if account.health_score >= settings.ACCOUNT_HEALTH_OFFLINE_SCORE
+    ]
+    if len(healthy) < len(authenticated_accounts):
+        logger.warning(f'跳过 {len(authenticated_accounts) - len(healthy)} 个健康分低于下线阈值的账号')
+        authenticated_accounts = healthy
+    total = len(authenticated_accounts)
+    logger.info(f'正在上线 {total} 个账号, 并发数: {settings.ACCOUNT_LAUNCH_CONCURRENCY}')
+
+    semaphore = asyncio.Semaphore(settings.ACCOUNT_LAUNCH_CONCURRENCY)
+    report_step = max(total // 10, 1)
+    finished = 0
+
+    async def launch_one(account: AccountModel) -> bool:
+        nonlocal finished
+        async with semaphore:
+            if await client_manager.is_online(account.session_name):
+                launched = True
+            else:
+                launched = await client_manager.launch_client(
+                    account.session_name,
+                    timeout=settings.ACCOUNT_LAUNCH_TIMEOUT,
+                    receive_updates=account.receive_updates,
+                )
+
+        finished += 1
+        if finished % report_step == 0 or finished == total:
+            logger.info(f'账号上线进度: {finished}/{total}')
+        return launched
+
+    results = await asyncio.gather(*[launch_one(account) for account in authenticated_accounts])
+
+    # launch_client 已记录每个账号的在线状态, 这里一次性批量写回
+    await client_manager.flush_liveness()
+
+    launched_count = sum(results)
+    logger.info(f'账号上线完成: 成功 {launched_count}, 失败 {total - launched_count}')
 
 
 async def unlaunch_accounts(client_manager: ClientManager):
     online_accounts = await AccountCRUD().list_online()
     for account in online_accounts:
-        await client_manager.remove_client(account.session_name)
-        await AccountCRUD().update(account.id, {'online': False})
+        if client_manager.owns(account.session_name):
+            await client_manager.remove_client(account.session_name)
+    await client_manager.flush_liveness()
 
 
 async def stop_schedules(scheduler: AsyncIOScheduler):
@@ -31,11 +79,13 @@ async def stop_schedules(scheduler: AsyncIOScheduler):
             scheduler.remove_job(job.id)
         await ScheduleCRUD().update(schedule.id, {'status': ScheduleStatus.PENDING})
 
-    scheduler.pause_job('sync_channels')
-    scheduler.remove_job('sync_channels')
 
-    scheduler.pause_job('sync_accounts_online_status')
-    scheduler.remove_job('sync_accounts_online_status')
+async def stop_system_schedules(scheduler: AsyncIOScheduler):
+    channel_sync.stop()
+    for job_id in ('sync_channels', 'reconcile_channels', 'channel_health'):
+        if scheduler.get_job(job_id):
+            scheduler.pause_job(job_id)
+            scheduler.remove_job(job_id)
 
 
 async def stop_tasks():
@@ -1,101 +1,329 @@
+import asyncio
 import logging
+import random
 import traceback
-from typing import Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from telethon import types, TelegramClient
+from telethon import types
 from tortoise.transactions import in_transaction
 
 from app.constants.enum import AccountRole
+from app.core.config import settings
 from app.core.telegram_client import ClientManager, fetch_latest_channels
 from app.crud.account import AccountCRUD
 from app.crud.account_channel import AccountChannelCRUD
 from app.crud.channel import ChannelCRUD
 from app.db.models import AccountModel
 from app.utils.channel_tools import photo_to_base64
+from .channel_health import process_channel_health
 
 logger = logging.getLogger(__name__)
 
 
-async def sync_channels_to_db(channels: List[types.Channel], user_id: int, client: TelegramClient, account_id: int):
+async def download_channel_photos(
+        client_manager: ClientManager,
+        session_name: str,
+        channels: List[types.Channel],
+) -> Tuple[Dict[int, str], int]:
+    """
+    只下载头像标识(photo_id/dc_id)与数据库不同的频道, 每个下载各自占用一个账号名额并发进行.
+    返回 {频道tid: base64 头像} 以及下载的字节数; 下载失败的频道不更新头像标识, 下次同步重试.
+    """
+    known = await ChannelCRUD().get_photo_ids_by_tids([channel.id for channel in channels])
+    changed = [
+        channel for channel in channels
+        if isinstance(channel.photo, types.ChatPhoto)
+        and known.get(channel.id) != (channel.photo.photo_id, channel.photo.dc_id)
+    ]
+    if not changed:
+        return {}, 0
+
+    async def download(channel: types.Channel) -> bytes | None:
+        async with client_manager.get_client(session_name) as client:
+            return await client.download_profile_photo(channel, file=bytes)
+
+    results = await asyncio.gather(*[download(channel) for channel in changed], return_exceptions=True)
+
+    photos: Dict[int, str] = {}
+    downloaded_bytes = 0
+    for channel, result in zip(changed, results):
+        if isinstance(result, Exception):
+            logger.error(f'{session_name} 下载频道 {channel.id} 头像失败: {result}')
+        elif result:
+            photos[channel.id] = photo_to_base64(result)
+            downloaded_bytes += len(result)
+    return photos, downloaded_bytes
+
+
+async def sync_channels_to_db(
+        channels: List[types.Channel],
+        user_id: int,
+        account_id: int,
+        photos: Dict[int, str],
+) -> int:
+    """
+    预先各用一次查询取出已有频道和该账号的关联, 在内存中比对后,
+    只把有变化的行在一个事务内批量 upsert; 返回写入的行数.
+    """
+    if not channels:
+        return 0
+
+    channel_crud = ChannelCRUD()
+    link_crud = AccountChannelCRUD()
+    existing = {channel.tid: channel for channel in await channel_crud.list_by_tids([c.id for c in channels])}
+    links = {link.channel_id: link for link in await link_crud.list_by_account_id(account_id)}
+
+    # 每行需要更新的字段可能不同(用户名、头像可选), 按字段组合分组批量写入
+    upserts: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
     for channel in channels:
         data: Dict[str, Any] = {'user_id': user_id, 'title': channel.title}
         if channel.username:
             data.update({'username': channel.username})
 
-        if isinstance(channel.photo, types.ChatPhoto):
-            photo = await client.download_profile_photo(channel, file=bytes)
-            photo_base64 = photo_to_base64(photo)
-            data.update({'photo': photo_base64})
-
-        async with in_transaction():
-            created, updated = await ChannelCRUD().create_or_update_by_tid(channel.id, data)
-
-            # 如果当前账号是管理员但未同步到数据库, 则同步
-            current_channel = await ChannelCRUD().get_by_tid(channel.id)
-            created_c2a = await AccountChannelCRUD().get_by_channel_id_and_account_id(current_channel.id, account_id)
-
-            if created_c2a:
-                await AccountChannelCRUD().update(
-                    created_c2a.id,
-                    {'role': AccountRole.OWNER if channel.creator else AccountRole.ADMIN}
-                )
-            if created or created_c2a is None:
-                c2a_data = {
-                    'account_id': account_id,
-                    'channel_id': current_channel.id,
-                    'access_hash': channel.access_hash,
-                    'role': AccountRole.OWNER if channel.creator else AccountRole.ADMIN,
-                }
-                await AccountChannelCRUD().create(c2a_data)
+        if channel.id in photos:
+            data.update({
+                'photo': photos[channel.id],
+                'photo_id': channel.photo.photo_id,
+                'photo_dc_id': channel.photo.dc_id,
+            })
+
+        current = existing.get(channel.id)
+        if current is not None and all(getattr(current, key) == value for key, value in data.items()):
+            continue
+        upserts.setdefault(tuple(data), []).append({'tid': channel.id, **data})
+
+    link_rows = []
+    async with in_transaction():
+        for fields, rows in upserts.items():
+            await channel_crud.bulk_upsert_by_tid(rows, list(fields))
+
+        channel_ids = {tid: channel.id for tid, channel in existing.items()}
+        channel_ids.update(await channel_crud.get_ids_by_tids([c.id for c in channels if c.id not in existing]))
+
+        for channel in channels:
+            channel_id = channel_ids[channel.id]
+            role = AccountRole.OWNER if channel.creator else AccountRole.ADMIN
+            link = links.get(channel_id)
+            if link is not None and link.role == role and link.access_hash == channel.access_hash:
+                continue
+            link_rows.append({
+                'account_id': account_id,
+                'channel_id': channel_id,
+                'access_hash': channel.access_hash,
+                'role': role,
+            })
+        await link_crud.bulk_upsert(link_rows)
+
+    channel_rows = sum(len(rows) for rows in upserts.values())
+    if channel_rows or link_rows:
+        logger.info(
+            f'账号 {account_id} 同步 {len(channels)} 个频道, 写入频道 {channel_rows} 个, 关联 {len(link_rows)} 个'
+        )
+    return channel_rows + len(link_rows)
+
+
+async def sync_account_channels(client_manager: ClientManager, account: AccountModel) -> Tuple[int, int, int]:
+    """只在 RPC 阶段占用账号, 数据库写入在释放后进行; 返回下载的头像数、字节数与写入的行数"""
+    async with client_manager.get_client(account.session_name) as client:
+        latest_channels = await fetch_latest_channels(client)
+    client_manager.peer_cache.update(
+        account.session_name,
+        [(channel.id, channel.access_hash) for channel in latest_channels]
+    )
+    photos, downloaded_bytes = await download_channel_photos(client_manager, account.session_name, latest_channels)
+    changed = await sync_channels_to_db(latest_channels, account.user_id, account.id, photos)
+    return len(photos), downloaded_bytes, changed
 
 
 async def process_sync_channels(client_manager: ClientManager):
+    """
+    全量校对: 拉取所有在线账号的全部对话并同步频道, 兜底事件同步和按账号轮询遗漏的变化.
+    """
     try:
-        online_accounts: List[AccountModel] = await AccountCRUD().list_online()
-        for account in online_accounts:
-            async with client_manager.get_client(account.session_name) as client:
-                latest_channels = await fetch_latest_channels(client)
-                await sync_channels_to_db(latest_channels, account.user.id, client, account.id)
+        online_accounts: List[AccountModel] = [
+            account for account in await AccountCRUD().list_online()
+            if client_manager.owns(account.session_name)
+        ]
     except Exception as e:
         traceback.print_exc()
         logger.error(e)
+        return
+
+    semaphore = asyncio.Semaphore(settings.CHANNEL_SYNC_CONCURRENCY)
+
+    async def sync_one(account: AccountModel) -> Tuple[int, int, int]:
+        async with semaphore:
+            try:
+                return await sync_account_channels(client_manager, account)
+            except Exception as e:
+                logger.error(f'{account.session_name} 同步频道失败: {e}')
+                return 0, 0, 0
+
+    results = await asyncio.gather(*[sync_one(account) for account in online_accounts])
+    logger.info(
+        f'{len(online_accounts)} 个账号频道同步完成, '
+        f'下载头像 {sum(result[0] for result in results)} 个, 共 {sum(result[1] for result in results)} 字节'
+    )
+
+
+SYNC_JOB_PREFIX = 'sync_channels:'
+
+
+class ChannelSyncCadence:
+    """
+    为每个不接收更新的在线账号单独安排频道同步, 首次执行时间随机分散;
+    本次同步有写入时间隔减半, 无变化时放大 1.5 倍, 限制在 [min_interval, max_interval] 分钟内.
+    """
+
+    def __init__(self, initial_interval: int, min_interval: int, max_interval: int, concurrency: int):
+        self.initial_interval = initial_interval * 60
+        self.min_interval = min_interval * 60
+        self.max_interval = max_interval * 60
+        self.concurrency = concurrency
+        self.intervals: Dict[str, float] = {}
+        # 正在执行同步的账号: date 任务触发后已从调度器中移除, 不能据此判断为漏调度
+        self.running: set[str] = set()
+        self.scheduler: AsyncIOScheduler | None = None
+        self.client_manager: ClientManager | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def start(self, scheduler: AsyncIOScheduler, client_manager: ClientManager):
+        self.scheduler = scheduler
+        self.client_manager = client_manager
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        client_manager.sync_handler = self.sync_now
+
+    def stop(self):
+        if self.scheduler is not None:
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith(SYNC_JOB_PREFIX):
+                    job.remove()
+        self.intervals.clear()
+
+    def _wanted(self, session_name: str) -> bool:
+        return self.client_manager.owns(session_name) and session_name not in self.client_manager.update_receivers
+
+    def _schedule(self, session_name: str, delay: float):
+        self.scheduler.add_job(
+            func=self.run,
+            trigger='date',
+            run_date=datetime.now(self.scheduler.timezone) + timedelta(seconds=delay),
+            args=[session_name],
+            id=f'{SYNC_JOB_PREFIX}{session_name}',
+            replace_existing=True,
+            # 启动或同步繁忙时任务可能延迟触发, 不设宽限时间, 避免被静默丢弃
+            misfire_grace_time=None,
+            coalesce=True,
+        )
+
+    async def schedule_new_accounts(self):
+        """
+        给新上线的账号安排首次同步, 在初始间隔内随机分散, 避免同时发起请求;
+        已登记但没有待执行任务(如任务异常丢失)的账号重新安排.
+        """
+        for account in await AccountCRUD().list_online():
+            session_name = account.session_name
+            if not self._wanted(session_name) or session_name in self.running:
+                continue
+            if session_name in self.intervals:
+                if self.scheduler.get_job(f'{SYNC_JOB_PREFIX}{session_name}') is not None:
+                    continue
+                logger.warning(f'{session_name} 的频道同步任务丢失, 重新安排')
+                self._schedule(session_name, random.uniform(0, self.intervals[session_name]))
+                continue
+            self.intervals[session_name] = self.initial_interval
+            self._schedule(session_name, random.uniform(0, self.initial_interval))
+
+    def _adapt(self, session_name: str, changed: int) -> float:
+        interval = self.intervals.get(session_name, self.initial_interval)
+        if changed:
+            interval = max(self.min_interval, interval / 2)
+        else:
+            interval = min(self.max_interval, interval * 1.5)
+        self.intervals[session_name] = interval
+        return interval
+
+    async def _sync(self, session_name: str) -> int:
+        account = await AccountCRUD().get_by_session_name(session_name)
+        if account is None:
+            raise ValueError(f'账号 {session_name} 不存在')
+        async with self._semaphore:
+            _, _, changed = await sync_account_channels(self.client_manager, account)
+        return changed
+
+    async def run(self, session_name: str):
+        if not self._wanted(session_name) or not await self.client_manager.is_online(session_name):
+            self.intervals.pop(session_name, None)
+            return
+
+        self.running.add(session_name)
+        try:
+            try:
+                changed = await self._sync(session_name)
+            except Exception as e:
+                logger.error(f'{session_name} 同步频道失败: {e}')
+                changed = 0
+
+            interval = self._adapt(session_name, changed)
+            self._schedule(session_name, interval * random.uniform(0.9, 1.1))
+        finally:
+            self.running.discard(session_name)
+
+    async def sync_now(self, session_name: str) -> int:
+        """立即同步一个账号, 不受轮询间隔限制; 之后按新的间隔重新安排"""
+        changed = await self._sync(session_name)
+        if self._wanted(session_name):
+            interval = self._adapt(session_name, changed)
+            self._schedule(session_name, interval * random.uniform(0.9, 1.1))
+        return changed
+
+
+channel_sync = ChannelSyncCadence(
+    settings.CHANNEL_SYNC_INTERVAL,
+    settings.CHANNEL_SYNC_MIN_INTERVAL,
+    settings.CHANNEL_SYNC_MAX_INTERVAL,
+    settings.CHANNEL_SYNC_CONCURRENCY,
+)
 
 
 async def add_sync_channels_schedule(scheduler: AsyncIOScheduler, client_manager: ClientManager):
+    # 定期检查新上线的账号并为其安排同步, 每个账号的同步任务各自调度
+    channel_sync.start(scheduler, client_manager)
     job_id = 'sync_channels'
     scheduler.add_job(
-        func=process_sync_channels,
+        func=channel_sync.schedule_new_accounts,
         trigger='interval',
-        args=[client_manager],
-        minutes=10,
+        minutes=settings.CHANNEL_SYNC_MIN_INTERVAL,
+        next_run_time=datetime.now(scheduler.timezone),
         id=job_id,
     )
 
 
-async def sync_accounts_online_status(client_manager: ClientManager):
-    try:
-        authenticated_accounts: List[AccountModel] = await AccountCRUD().list_authenticated()
-        for account in authenticated_accounts:
-            if await client_manager.is_online(account.session_name):
-                await AccountCRUD().update(account.id, {'online': True})
-            else:
-                await AccountCRUD().update(account.id, {'online': False})
-    except Exception as e:
-        logger.error(e)
+async def add_reconcile_channels_schedule(scheduler: AsyncIOScheduler, client_manager: ClientManager):
+    job_id = 'reconcile_channels'
+    scheduler.add_job(
+        func=process_sync_channels,
+        trigger='interval',
+        args=[client_manager],
+        minutes=settings.CHANNEL_RECONCILE_INTERVAL,
+        id=job_id,
+    )
 
 
-async def add_sync_accounts_online_status_schedule(scheduler: AsyncIOScheduler, client_manager: ClientManager):
-    job_id = 'sync_accounts_online_status'
+async def add_channel_health_schedule(scheduler: AsyncIOScheduler, client_manager: ClientManager):
+    job_id = 'channel_health'
     scheduler.add_job(
-        func=sync_accounts_online_status,
+        func=process_channel_health,
         trigger='interval',
         args=[client_manager],
-        minutes=60,
-        id=job_id
+        minutes=settings.CHANNEL_HEALTH_INTERVAL,
+        id=job_id,
     )
 
 
 async def add_system_schedules(scheduler: AsyncIOScheduler, client_manager: ClientManager):
     await add_sync_channels_schedule(scheduler, client_manager)
-    await add_sync_accounts_online_status_schedule(scheduler, client_manager)
+    await add_reconcile_channels_schedule(scheduler, client_manager)
+    await add_channel_health_schedule(scheduler, client_manager)
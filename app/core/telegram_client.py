@@ -1,136 +1,827 @@
 # channel/client.py
 
 import asyncio
+import hashlib
 import logging
-from contextlib import asynccontextmanager
-from typing import List, Dict, Tuple
+import os
+import random
+import time
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Mapping, Iterable, Callable, Awaitable, Any
 
-from telethon import TelegramClient, types, functions
+from telethon import TelegramClient, types, functions, errors, utils
+from telethon.sessions import MemorySession
+from telethon.tl.tlobject import TLRequest
 
 from app.core.config import settings
+from app.core.proxy_pool import ProxyPool, proxy_pool as default_proxy_pool
+from app.core.session_storage import session_store
+from app.core.upload_cache import UploadCache, InputFileType, media_from_message
+from app.crud.account import AccountCRUD
+from app.crud.account_channel import AccountChannelCRUD
+from app.exceptions import RateLimitedError
+from app.task.queues import queue_manager
 
 logger = logging.getLogger(__name__)
 
 
+OPERATION_UPLOAD = 'upload'
+
+
+def shard_of(session_name: str, shards: int) -> int:
+    return zlib.crc32(session_name.encode()) % shards
+
+
+class ClientEntry:
+    def __init__(self, client: TelegramClient, width: int = 1):
+        self.client = client
+        self.width = max(width, 1)
+        self.semaphore = asyncio.Semaphore(self.width)
+        # 独占操作需要拿到全部名额, 用锁串行化避免两个独占操作各拿一部分名额而互相等待
+        self.exclusive_lock = asyncio.Lock()
+        # 正在使用或等待名额的调用数, 以及最近一次使用时间, 供空闲回收和 LRU 淘汰使用
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+    async def acquire(self, exclusive: bool = False):
+        if not exclusive:
+            await self.semaphore.acquire()
+            return
+
+        async with self.exclusive_lock:
+            acquired = 0
+            try:
+                while acquired < self.width:
+                    await self.semaphore.acquire()
+                    acquired += 1
+            except BaseException:
+                for _ in range(acquired):
+                    self.semaphore.release()
+                raise
+
+    def release(self, exclusive: bool = False):
+        for _ in range(self.width if exclusive else 1):
+            self.semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, exclusive: bool = False):
+        self.in_use += 1
+        try:
+            await self.acquire(exclusive)
+            try:
+                yield self.client
+            finally:
+                self.release(exclusive)
+        finally:
+            self.in_use -= 1
+            self.last_used = time.monotonic()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, count: int = 1) -> float:
+        """取出 count 个令牌, 成功返回 0, 否则返回需要等待的秒数"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self._refill(now)
+        if self.tokens >= count:
+            self.tokens -= count
+            return 0.0
+        return (count - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    按 (账号, RPC方法) 维护令牌桶.
+    遭遇 FloodWait 时在等待期内封锁该桶并将速率减半, 之后每次成功调用缓慢恢复速率(AIMD).
+    """
+
+    def __init__(self, rate: float, capacity: int, min_rate: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def _bucket(self, session_name: str, method: str) -> TokenBucket:
+        key = (session_name, method)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+            self.buckets[key] = bucket
+        return bucket
+
+    def acquire(self, session_name: str, method: str, count: int = 1) -> float:
+        return self._bucket(session_name, method).take(count)
+
+    def record_success(self, session_name: str, method: str):
+        bucket = self._bucket(session_name, method)
+        if bucket.rate < self.rate:
+            bucket.rate = min(self.rate, bucket.rate + self.rate * 0.05)
+
+    def record_flood_wait(self, session_name: str, method: str, seconds: float):
+        bucket = self._bucket(session_name, method)
+        bucket.blocked_until = time.monotonic() + seconds
+        bucket.tokens = 0.0
+        bucket.rate = max(self.min_rate, bucket.rate / 2)
+        logger.warning(f'{session_name} 调用 {method} 触发 FloodWait {seconds} 秒, 速率降至 {bucket.rate:.3f}/s')
+
+    def blocked_for(self, session_name: str) -> float:
+        now = time.monotonic()
+        waits = [
+            bucket.blocked_until - now
+            for (name, _), bucket in self.buckets.items()
+            if name == session_name and bucket.blocked_until > now
+        ]
+        return max(waits, default=0.0)
+
+
+class AccountHealth:
+    def __init__(self):
+        self.score = 1.0
+        self.latency_ms: float | None = None
+        self.cooldown_until = 0.0
+        # 最近一次写回数据库的分数
+        self.persisted_score: float | None = None
+
+
+class HealthTracker:
+    """
+    按账号维护滚动健康分(0~1 的指数加权平均): 成功记 1, 响应过慢、FloodWait、网络错误按比例扣分, PEER_FLOOD 记 0,
+    授权失效直接清零. 健康分低于 cooldown_score 时暂停使用该账号 cooldown 秒, 低于 offline_score 时由连接监督将其下线.
+    """
+
+    AUTH_ERRORS = (
+        errors.AuthKeyUnregisteredError,
+        errors.AuthKeyDuplicatedError,
+        errors.SessionRevokedError,
+        errors.UserDeactivatedError,
+        errors.UserDeactivatedBanError,
+    )
+
+    def __init__(
+            self,
+            alpha: float,
+            slow_ms: float,
+            cooldown_score: float,
+            cooldown: float,
+            offline_score: float,
+    ):
+        self.alpha = alpha
+        self.slow_ms = slow_ms
+        self.cooldown_score = cooldown_score
+        self.cooldown = cooldown
+        self.offline_score = offline_score
+        self.accounts: Dict[str, AccountHealth] = {}
+
+    def _state(self, session_name: str) -> AccountHealth:
+        state = self.accounts.get(session_name)
+        if state is None:
+            state = AccountHealth()
+            self.accounts[session_name] = state
+        return state
+
+    def _record(self, session_name: str, sample: float, cooldown: bool = False):
+        state = self._state(session_name)
+        state.score = state.score * (1 - self.alpha) + sample * self.alpha
+        now = time.monotonic()
+        if now >= state.cooldown_until and (cooldown or state.score < self.cooldown_score):
+            state.cooldown_until = now + self.cooldown
+            logger.warning(f'{session_name} 健康分降至 {state.score:.2f}, 暂停使用 {self.cooldown:.0f} 秒')
+
+    def record_success(self, session_name: str, latency_ms: float | None = None):
+        if latency_ms is None:
+            self._record(session_name, 1.0)
+            return
+        state = self._state(session_name)
+        if state.latency_ms is None:
+            state.latency_ms = latency_ms
+        else:
+            state.latency_ms = state.latency_ms * (1 - self.alpha) + latency_ms * self.alpha
+        self._record(session_name, 0.7 if latency_ms > self.slow_ms else 1.0)
+
+    def record_flood_wait(self, session_name: str):
+        self._record(session_name, 0.3)
+
+    def record_error(self, session_name: str, error: Exception):
+        if isinstance(error, self.AUTH_ERRORS):
+            self._state(session_name).score = 0.0
+            logger.warning(f'{session_name} 授权已失效({error.__class__.__name__}), 健康分清零')
+        elif isinstance(error, errors.PeerFloodError):
+            self._record(session_name, 0.0, cooldown=True)
+        elif isinstance(error, (ConnectionError, asyncio.TimeoutError, errors.ServerError)):
+            self._record(session_name, 0.5)
+        # 其余 RPC 错误(用户名已占用等)属于业务错误, 不影响健康分
+
+    def cooldown_for(self, session_name: str) -> float:
+        state = self.accounts.get(session_name)
+        if state is None:
+            return 0.0
+        return max(state.cooldown_until - time.monotonic(), 0.0)
+
+    def score(self, session_name: str) -> float:
+        state = self.accounts.get(session_name)
+        return 1.0 if state is None else state.score
+
+    def degraded(self) -> List[str]:
+        return [name for name, state in self.accounts.items() if state.score < self.offline_score]
+
+    def reset(self, session_name: str):
+        self.accounts.pop(session_name, None)
+
+    def pop_changes(self) -> Dict[str, float]:
+        """取出相对上次写回变化超过 0.01 的分数, 并视为已写回"""
+        changes = {}
+        for name, state in self.accounts.items():
+            score = round(state.score, 2)
+            if state.persisted_score is None or abs(score - state.persisted_score) >= 0.01:
+                changes[name] = score
+                state.persisted_score = score
+        return changes
+
+    def mark_unpersisted(self, session_names: Iterable[str]):
+        for name in session_names:
+            state = self.accounts.get(name)
+            if state is not None:
+                state.persisted_score = None
+
+
+class PeerCache:
+    """
+    按 (账号, 频道tid) 缓存 access_hash, 直接构造 InputPeerChannel/InputChannel,
+    避免 Telethon 在调用前额外解析实体. access_hash 与账号绑定, 因此不能跨账号共用.
+    """
+
+    def __init__(self):
+        self._access_hashes: Dict[Tuple[str, int], int] = {}
+
+    def put(self, session_name: str, tid: int, access_hash: int):
+        self._access_hashes[(session_name, tid)] = access_hash
+
+    def update(self, session_name: str, peers: Iterable[Tuple[int, int]]):
+        for tid, access_hash in peers:
+            self.put(session_name, tid, access_hash)
+
+    def invalidate(self, session_name: str, tid: int):
+        self._access_hashes.pop((session_name, tid), None)
+
+    def drop(self, session_name: str):
+        for key in [key for key in self._access_hashes if key[0] == session_name]:
+            del self._access_hashes[key]
+
+    def input_channel(self, session_name: str, tid: int, access_hash: int | None = None) -> types.InputChannel | None:
+        access_hash = self._access_hashes.get((session_name, tid), access_hash)
+        if access_hash is None:
+            return None
+        return types.InputChannel(tid, access_hash)
+
+    def input_peer(self, session_name: str, tid: int) -> types.InputPeerChannel | None:
+        access_hash = self._access_hashes.get((session_name, tid))
+        if access_hash is None:
+            return None
+        return types.InputPeerChannel(tid, access_hash)
+
+    async def load(self, session_name: str):
+        self.update(session_name, await AccountChannelCRUD().list_peers_by_session_name(session_name))
+
+    @contextmanager
+    def guard(self, session_name: str, tid: int):
+        """频道失效(CHANNEL_INVALID)时丢弃对应缓存"""
+        try:
+            yield
+        except errors.ChannelInvalidError:
+            self.invalidate(session_name, tid)
+            raise
+
+
 class ClientManager:
     def __init__(
             self,
             *,
             api_id: int,
             api_hash: str,
-            enable_proxy: bool,
-            proxy: Tuple[str, str, int, str, str],
+            proxy_pool: ProxyPool | None,
             sessions_root: str,
             # sessions: List[str],
+            concurrency_per_account: int = 1,
+            exclusive_operations: List[str] | None = None,
+            rate_limiter: RateLimiter | None = None,
+            health: HealthTracker | None = None,
+            upload_cache: UploadCache | None = None,
+            lazy_connect: bool = False,
+            idle_ttl: int = 0,
+            max_resident: int = 0,
+            reconnect_base_delay: float = 5,
+            reconnect_max_delay: float = 600,
+            shard: Tuple[int, int] | None = None,
     ):
         self.api_id = api_id
         self.api_hash = api_hash
-        self.enable_proxy = enable_proxy
-        self.proxy = proxy
+        self.proxy_pool = proxy_pool
         self.sessions_root = sessions_root
         # self.sessions = sessions
+        self.concurrency_per_account = concurrency_per_account
+        self.exclusive_operations = set(exclusive_operations or [])
+        self.peer_cache = PeerCache()
+        self.rate_limiter = rate_limiter or RateLimiter(
+            settings.RATE_LIMIT_RATE,
+            settings.RATE_LIMIT_BURST,
+            settings.RATE_LIMIT_MIN_RATE,
+        )
+        self.health = health or HealthTracker(
+            settings.ACCOUNT_HEALTH_ALPHA,
+            settings.ACCOUNT_HEALTH_SLOW_MS,
+            settings.ACCOUNT_HEALTH_COOLDOWN_SCORE,
+            settings.ACCOUNT_HEALTH_COOLDOWN,
+            settings.ACCOUNT_HEALTH_OFFLINE_SCORE,
+        )
+        self.upload_cache = upload_cache or UploadCache(settings.UPLOAD_CACHE_TTL, uploader=fast_upload_file)
+
+        self.lazy_connect = lazy_connect
+        self.idle_ttl = idle_ttl
+        self.max_resident = max_resident
+
+        # 按需连接模式下已上线(登记)但不一定常驻连接的账号
+        self.registered: set[str] = set()
+        # 需要接收 Telegram 推送更新的账号, 其余账号连接时关闭更新流
+        self.update_receivers: set[str] = set()
+        # 每次建立新连接后调用, 用于给客户端注册事件处理器
+        self.connect_hooks: List[Callable[[str, TelegramClient], None]] = []
+        # 由频道同步调度注册, 用于立即同步单个账号
+        self.sync_handler: Callable[[str], Awaitable[int]] | None = None
+        self._connecting: Dict[str, asyncio.Task] = {}
+        # 每个账号已投递到队列、尚未处理完的任务数, 用于在多个管理账号之间选择负载最低的账号
+        self.queued: Dict[str, int] = {}
+        self._reaper_task: asyncio.Task | None = None
+
+        # 多进程引擎下当前进程负责的分片 (序号, 总数), None 表示负责全部账号
+        self.shard = shard
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+
+        # 内存中的在线状态表, 只有发生变化的账号才会被批量写回 accounts.online
+        self.liveness: Dict[str, bool] = {}
+        self._liveness_changes: Dict[str, bool] = {}
+        # 断线账号的重连次数与下次允许重连的时间
+        self._reconnect_backoff: Dict[str, Tuple[int, float]] = {}
+        self._supervisor_task: asyncio.Task | None = None
 
-        self.clients: Dict[str, TelegramClient] = {}
-        self.locks: Dict[str, asyncio.Lock] = {}
+        # 写时复制的只读快照: 读操作直接访问, 无需加锁; 只有连接/移除时在 _manager_lock 下替换整个快照
+        self._entries: Mapping[str, ClientEntry] = MappingProxyType({})
 
         self._manager_lock = asyncio.Lock()
 
-    async def connect_client(self, session_name: str) -> bool:
-        session_path = f'{self.sessions_root}/{session_name}'
+    @property
+    def clients(self) -> Dict[str, TelegramClient]:
+        return {name: entry.client for name, entry in self._entries.items()}
 
-        proxy_info = self.proxy if self.enable_proxy else None
+    def _put_entry(self, session_name: str, entry: ClientEntry):
+        entries = dict(self._entries)
+        entries[session_name] = entry
+        self._entries = MappingProxyType(entries)
+
+    def _pop_entry(self, session_name: str) -> ClientEntry | None:
+        entries = dict(self._entries)
+        entry = entries.pop(session_name, None)
+        self._entries = MappingProxyType(entries)
+        return entry
+
+    async def connect_client(self, session_name: str, timeout: float | None = None) -> bool:
+        session = await session_store.build(self.sessions_root, session_name)
+
+        try:
+            proxy_info = self.proxy_pool.assign(session_name) if self.proxy_pool else None
+        except Exception as e:
+            logger.error(f'为 {session_name} 分配代理失败: {e}')
+            return False
 
-        client = TelegramClient(session_path, self.api_id, self.api_hash, proxy=proxy_info)
+        # FloodWait 交给 RateLimiter 处理, 不让 Telethon 在占用账号时原地休眠
+        client = TelegramClient(
+            session,
+            self.api_id,
+            self.api_hash,
+            proxy=proxy_info,
+            flood_sleep_threshold=0,
+            receive_updates=session_name in self.update_receivers,
+        )
 
         try:
             logger.info(f'正在连接 {session_name} ...')
-            await client.connect()
-            if not await client.is_user_authorized():
+            await asyncio.wait_for(client.connect(), timeout)
+            self._record_proxy_result(session_name, True)
+            if not await asyncio.wait_for(client.is_user_authorized(), timeout):
                 logger.info(f'{session_name} 未授权, 请检查或重新登录')
                 await client.disconnect()
                 return False
 
             async with self._manager_lock:
-                self.clients[session_name] = client
-                self.locks[session_name] = asyncio.Lock()
+                self._put_entry(session_name, ClientEntry(client, self.concurrency_per_account))
 
             logger.info(f'{session_name} 连接成功.')
+
+            for hook in self.connect_hooks:
+                try:
+                    hook(session_name, client)
+                except Exception as e:
+                    logger.error(f'{session_name} 执行连接回调失败: {e}')
+
+            try:
+                await self.peer_cache.load(session_name)
+            except Exception as e:
+                logger.error(f'加载 {session_name} 的频道缓存失败: {e}')
+
+            if self.lazy_connect and self.max_resident and len(self._entries) > self.max_resident:
+                await self._evict_lru(len(self._entries) - self.max_resident, keep=session_name)
             return True
+        except asyncio.TimeoutError:
+            logger.error(f'连接 {session_name} 超时')
+            self._record_proxy_result(session_name, False)
+            await client.disconnect()
+            return False
         except Exception as e:
             logger.error(f'连接 {session_name} 时发生错误: {e}')
+            if client.is_connected():
+                await client.disconnect()
+            else:
+                self._record_proxy_result(session_name, False)
             return False
 
+    def add_connect_hook(self, hook: Callable[[str, TelegramClient], None]):
+        self.connect_hooks.append(hook)
+
+    async def sync_channels(self, session_name: str) -> int:
+        if self.sync_handler is None:
+            raise ValueError('频道同步尚未启动')
+        return await self.sync_handler(session_name)
+
+    def _record_proxy_result(self, session_name: str, success: bool):
+        if self.proxy_pool is None:
+            return
+        if success:
+            self.proxy_pool.record_success(session_name)
+        else:
+            self.proxy_pool.record_error(session_name)
+
+    async def proxy_stats(self) -> List[Dict]:
+        return self.proxy_pool.stats() if self.proxy_pool else []
+
+    async def upload_stats(self) -> Dict[str, int]:
+        return self.upload_cache.stats()
+
     # async def connect_all(self):
     #     tasks = [self.connect_client(session) for session in self.sessions]
     #     await asyncio.gather(*tasks)
 
+    def owns(self, session_name: str) -> bool:
+        if self.shard is None:
+            return True
+        index, shards = self.shard
+        return shard_of(session_name, shards) == index
+
+    async def enqueue(self, queue_name: str, session_name: str, task_data: Tuple | List):
+        self.queued[session_name] = self.queued.get(session_name, 0) + 1
+        queue_manager.get(queue_name).put_nowait(tuple(task_data))
+
+    def task_done(self, session_name: str, count: int = 1):
+        remaining = self.queued.get(session_name, 0) - count
+        if remaining > 0:
+            self.queued[session_name] = remaining
+        else:
+            self.queued.pop(session_name, None)
+
+    async def load_scores(self, session_names: List[str]) -> Dict[str, float]:
+        """
+        账号负载评分, 越低越空闲: 排队中的任务数, 加上 FloodWait 封锁和健康分冷却期间本可处理的请求数,
+        以及按健康分折算的惩罚; 未上线的账号为无穷大.
+        """
+        scores = {}
+        for name in session_names:
+            if name not in self._entries and name not in self.registered:
+                scores[name] = float('inf')
+                continue
+            blocked = max(self.rate_limiter.blocked_for(name), self.health.cooldown_for(name))
+            scores[name] = (
+                self.queued.get(name, 0)
+                + blocked * self.rate_limiter.rate
+                + (1 - self.health.score(name)) * settings.CHANNEL_ROUTING_HEALTH_WEIGHT
+            )
+        return scores
+
+    async def launch_client(
+            self,
+            session_name: str,
+            timeout: float | None = None,
+            receive_updates: bool = False,
+    ) -> bool:
+        # 重新上线的账号从满分开始重新统计
+        self.health.reset(session_name)
+        if receive_updates:
+            self.update_receivers.add(session_name)
+        else:
+            self.update_receivers.discard(session_name)
+
+        if self.lazy_connect:
+            self.registered.add(session_name)
+            self._set_liveness(session_name, True)
+            return True
+        launched = await self.connect_client(session_name, timeout)
+        self._set_liveness(session_name, launched)
+        return launched
+
     async def is_online(self, session_name: str) -> bool:
-        async with self._manager_lock:
-            return session_name in self.clients
+        return session_name in self._entries or session_name in self.registered
+
+    async def _ensure_connected(self, session_name: str) -> ClientEntry:
+        # 同一账号的并发首次调用共享同一次连接
+        task = self._connecting.get(session_name)
+        if task is None:
+            task = asyncio.create_task(self.connect_client(session_name))
+            self._connecting[session_name] = task
+            task.add_done_callback(lambda _: self._connecting.pop(session_name, None))
+
+        await asyncio.shield(task)
+        entry = self._entries.get(session_name)
+        if entry is None:
+            raise ValueError(f'{session_name} 按需连接失败')
+        return entry
 
     @asynccontextmanager
-    async def get_client(self, session_name: str):
+    async def get_client(
+            self,
+            session_name: str,
+            operation: str | None = None,
+            method: str | None = None,
+            count: int = 1,
+            record_health: bool = True,
+    ):
+        """
+        method 为本次要调用的 RPC 名称(如 'CreateChannelRequest'), 传入后会经过 RateLimiter,
+        批量发送时 count 为本次请求数: 令牌不足、账号健康分过低冷却中或遭遇 FloodWait 时抛出 RateLimitedError,
+        且在抛出前已释放账号名额. 传入 method 的调用结果和耗时会计入账号健康分, 因此 async with 内只应包含 RPC 调用,
+        数据库写入等其他操作放在外面, 避免其耗时和异常(如数据库连接失败)被算到账号头上;
+        容器内每个请求结果不同的批量调用传入 record_health=False, 由调用方逐个记录.
+        """
+        entry = self._entries.get(session_name)
+        if entry is None and session_name not in self.registered:
+            raise ValueError(f'{session_name} 客户端不存在或未连接成功')
+
+        if method:
+            cooldown = self.health.cooldown_for(session_name)
+            if cooldown > 0:
+                raise RateLimitedError(cooldown, f'{session_name} 健康分过低, 冷却中, 需等待 {cooldown:.0f} 秒')
+            wait = self.rate_limiter.acquire(session_name, method, count)
+            if wait > 0:
+                raise RateLimitedError(wait)
+
+        if entry is None:
+            entry = await self._ensure_connected(session_name)
+
+        flood_wait = None
+        record_health = bool(method) and record_health
+        async with entry.slot(exclusive=operation in self.exclusive_operations) as client:
+            started = time.monotonic()
+            try:
+                yield client
+            except errors.FloodWaitError as e:
+                flood_wait = e
+                self.rate_limiter.record_flood_wait(session_name, method or 'unknown', e.seconds)
+                if record_health:
+                    self.health.record_flood_wait(session_name)
+            except Exception as e:
+                if record_health:
+                    self.health.record_error(session_name, e)
+                raise
+            else:
+                if method:
+                    self.rate_limiter.record_success(session_name, method)
+                if record_health:
+                    # 上传耗时取决于文件大小, 不计入响应耗时
+                    latency_ms = None if operation == OPERATION_UPLOAD else (time.monotonic() - started) * 1000 / count
+                    self.health.record_success(session_name, latency_ms)
+
+        if flood_wait is not None:
+            raise RateLimitedError(flood_wait.seconds) from flood_wait
+
+    async def _evict(self, session_name: str) -> bool:
         async with self._manager_lock:
-            if session_name not in self.locks:
-                raise ValueError(f'{session_name} 客户端不存在或未连接成功')
+            entry = self._entries.get(session_name)
+            if entry is None or entry.in_use:
+                return False
+            self._pop_entry(session_name)
 
-            lock = self.locks[session_name]
-            client = self.clients[session_name]
+        async with entry.slot(exclusive=True):
+            if entry.client.is_connected():
+                await entry.client.disconnect()
+        # 被淘汰的客户端不再占用代理连接数, 下次按需连接时由 connect_client 重新分配;
+        # 断开期间该账号可能已被重新连接, 此时代理属于新连接, 不能释放
+        if self.proxy_pool and session_name not in self._entries and session_name not in self._connecting:
+            self.proxy_pool.release(session_name)
+        return True
 
-        await lock.acquire()
-        try:
-            yield client
-        finally:
-            lock.release()
+    async def _evict_lru(self, count: int, keep: str | None = None):
+        candidates = sorted(
+            (entry.last_used, name) for name, entry in self._entries.items()
+            if name != keep and not entry.in_use
+        )
+        evicted = 0
+        for _, name in candidates:
+            if evicted >= count:
+                break
+            if await self._evict(name):
+                evicted += 1
+        if evicted:
+            logger.info(f'常驻客户端超过上限 {self.max_resident}, 已淘汰 {evicted} 个最近最少使用的客户端')
 
-    async def remove_client(self, session_name: str):
-        client_to_remove = None
-        lock_to_wait_on = None
+    async def evict_idle(self):
+        deadline = time.monotonic() - self.idle_ttl
+        idle = [name for name, entry in self._entries.items() if not entry.in_use and entry.last_used < deadline]
+        evicted = [name for name in idle if await self._evict(name)]
+        if evicted:
+            logger.info(f'已断开 {len(evicted)} 个空闲超过 {self.idle_ttl} 秒的客户端')
+
+    async def _reap_idle_forever(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f'回收空闲客户端时发生错误: {e}')
+
+    def start_idle_reaper(self, interval: int):
+        if self.lazy_connect and self.idle_ttl and self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap_idle_forever(interval))
+
+    def stop_idle_reaper(self):
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            self._reaper_task = None
 
+    async def remove_client(self, session_name: str):
+        was_registered = session_name in self.registered
+        self.registered.discard(session_name)
+        self.update_receivers.discard(session_name)
+        self.peer_cache.drop(session_name)
+        self.upload_cache.drop(session_name)
+        if self.proxy_pool:
+            self.proxy_pool.release(session_name)
+        self._set_liveness(session_name, False)
+        self._reconnect_backoff.pop(session_name, None)
         async with self._manager_lock:
-            if session_name in self.clients:
-                client_to_remove = self.clients.pop(session_name)
-                lock_to_wait_on = self.locks.pop(session_name)
-                logger.info(f'客户端 {session_name} 已从管理器中移除, 等待其他任务完成...')
-            else:
-                logger.warning(f'尝试移除不存在的客户端 {session_name}')
+            entry = self._pop_entry(session_name)
+            if entry is None:
+                if not was_registered:
+                    logger.warning(f'尝试移除不存在的客户端 {session_name}')
+                return
+            logger.info(f'客户端 {session_name} 已从管理器中移除, 等待其他任务完成...')
+
+        async with entry.slot(exclusive=True):
+            logger.info(f'客户端 {session_name} 的所有任务已完成, 准备断开连接...')
+            if entry.client.is_connected():
+                await entry.client.disconnect()
+            logger.info(f'客户端 {session_name} 已成功断开连接并移除.')
+
+    def _set_liveness(self, session_name: str, online: bool):
+        if self.liveness.get(session_name) != online:
+            self.liveness[session_name] = online
+            self._liveness_changes[session_name] = online
+
+    async def flush_liveness(self):
+        if not self._liveness_changes:
+            return
+        changes, self._liveness_changes = self._liveness_changes, {}
+        try:
+            for online in (True, False):
+                names = [name for name, value in changes.items() if value is online]
+                await AccountCRUD().update_online_by_session_names(names, online)
+        except Exception as e:
+            logger.error(f'写入账号在线状态失败, 稍后重试: {e}')
+            for name, online in changes.items():
+                self._liveness_changes.setdefault(name, online)
+
+    async def flush_health(self):
+        changes = self.health.pop_changes()
+        if not changes:
+            return
+        try:
+            await AccountCRUD().update_health_scores(changes)
+        except Exception as e:
+            logger.error(f'写入账号健康分失败, 稍后重试: {e}')
+            self.health.mark_unpersisted(changes)
+
+    async def take_degraded_offline(self):
+        degraded = [name for name in self.health.degraded() if name in self._entries or name in self.registered]
+        # 先写回健康分, 重启后低于下线阈值的账号不会被自动上线
+        await self.flush_health()
+        for name in degraded:
+            logger.warning(f'{name} 健康分 {self.health.score(name):.2f} 低于下线阈值, 自动下线')
+            await self.remove_client(name)
+
+    async def _reconnect(self, session_name: str, entry: ClientEntry, timeout: float):
+        attempts, _ = self._reconnect_backoff.get(session_name, (0, 0.0))
+        try:
+            if self.proxy_pool:
+                # 原代理被标记为不可用时会在这里切换到其他代理
+                entry.client.set_proxy(self.proxy_pool.assign(session_name))
+            await asyncio.wait_for(entry.client.connect(), timeout)
+            self._record_proxy_result(session_name, True)
+            if not await asyncio.wait_for(entry.client.is_user_authorized(), timeout):
+                logger.warning(f'{session_name} 授权已失效, 将其下线')
+                await self.remove_client(session_name)
                 return
+            self._reconnect_backoff.pop(session_name, None)
+            self._set_liveness(session_name, True)
+            logger.info(f'{session_name} 重连成功')
+        except Exception as e:
+            self._record_proxy_result(session_name, False)
+            # 带抖动的指数退避, 避免大量账号同时断线后同时重连
+            delay = min(self.reconnect_max_delay, self.reconnect_base_delay * 2 ** attempts)
+            delay *= random.uniform(0.5, 1.0)
+            self._reconnect_backoff[session_name] = (attempts + 1, time.monotonic() + delay)
+            logger.warning(f'{session_name} 第 {attempts + 1} 次重连失败, {delay:.0f} 秒后重试: {e}')
+
+    async def supervise(self, timeout: float | None = None):
+        now = time.monotonic()
+        reconnects = []
+        for name, entry in self._entries.items():
+            if entry.client.is_connected():
+                self._reconnect_backoff.pop(name, None)
+                self._set_liveness(name, True)
+                continue
+
+            self._set_liveness(name, False)
+            _, next_attempt_at = self._reconnect_backoff.get(name, (0, 0.0))
+            if now >= next_attempt_at:
+                reconnects.append(self._reconnect(name, entry, timeout))
 
-        if client_to_remove and lock_to_wait_on:
-            async with lock_to_wait_on:
-                logger.info(f'客户端 {session_name} 的所有任务已完成, 准备断开连接...')
-                if client_to_remove.is_connected():
-                    await client_to_remove.disconnect()
-                logger.info(f'客户端 {session_name} 已成功断开连接并移除.')
+        if reconnects:
+            await asyncio.gather(*reconnects)
+        await self.take_degraded_offline()
+        await self.flush_liveness()
+
+    async def _supervise_forever(self, interval: int, timeout: float | None):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.supervise(timeout)
+            except Exception as e:
+                logger.error(f'巡检客户端连接时发生错误: {e}')
+
+    def start_supervisor(self, interval: int, timeout: float | None = None):
+        if self._supervisor_task is None:
+            self._supervisor_task = asyncio.create_task(self._supervise_forever(interval, timeout))
+
+    async def stop_supervisor(self):
+        if self._supervisor_task is not None:
+            self._supervisor_task.cancel()
+            self._supervisor_task = None
+        await self.flush_health()
+        await self.flush_liveness()
 
     async def disconnect_all(self):
         logger.info('准备断开所有客户端连接...')
-        all_clients_to_disconnect = []
         async with self._manager_lock:
-            all_clients_to_disconnect = list(self.clients.values())
-            self.clients.clear()
-            self.locks.clear()
+            entries = list(self._entries.values())
+            self._entries = MappingProxyType({})
 
-        tasks = [client.disconnect() for client in all_clients_to_disconnect if client.is_connected()]
+        tasks = [entry.client.disconnect() for entry in entries if entry.client.is_connected()]
         await asyncio.gather(*tasks)
         logger.info('所有客户端已断开连接')
 
 
-async def setup_client_manager() -> ClientManager:
+async def setup_client_manager(shard: Tuple[int, int] | None = None) -> ClientManager:
     api_id = settings.TELEGRAM_API_ID
     api_hash = settings.TELEGRAM_API_HASH
-    enable_proxy = settings.ENABLE_PROXY
-    proxy = settings.PROXY
     sessions_root = settings.TELEGRAM_SESSIONS_ROOT
     # sessions_name = await AccountCRUD().list_authenticated_only_session_name()
 
     client_manager = ClientManager(
         api_id=api_id,
         api_hash=api_hash,
-        enable_proxy=enable_proxy,
-        proxy=proxy,
+        proxy_pool=default_proxy_pool,
         sessions_root=sessions_root,
         # sessions=sessions_name,
+        concurrency_per_account=settings.CLIENT_CONCURRENCY_PER_ACCOUNT,
+        exclusive_operations=settings.CLIENT_EXCLUSIVE_OPERATIONS,
+        lazy_connect=settings.CLIENT_LAZY_CONNECT,
+        idle_ttl=settings.CLIENT_IDLE_TTL,
+        max_resident=settings.CLIENT_MAX_RESIDENT,
+        reconnect_base_delay=settings.CLIENT_RECONNECT_BASE_DELAY,
+        reconnect_max_delay=settings.CLIENT_RECONNECT_MAX_DELAY,
+        shard=shard,
     )
 
     # await client_manager.connect_all()
@@ -138,12 +829,56 @@ async def setup_client_manager() -> ClientManager:
     return client_manager
 
 
-def get_static_client_for_phone(phone: str) -> TelegramClient:
-    session_file = str(settings.TELEGRAM_SESSIONS_ROOT / phone)
-    if settings.ENABLE_PROXY:
-        return TelegramClient(session_file, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH,
-                              proxy=settings.PROXY)
-    return TelegramClient(session_file, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH)
+# 登录、导入校验等临时客户端占用的代理名额, 断开后释放; 账号已上线时沿用其代理, 不释放
+_temporary_proxies: set[str] = set()
+
+
+def _assign_temporary_proxy(phone: str):
+    if not default_proxy_pool:
+        return None
+    launched = phone in default_proxy_pool.assignments
+    proxy = default_proxy_pool.assign(phone)
+    if not launched:
+        _temporary_proxies.add(phone)
+    return proxy
+
+
+def release_temporary_proxy(phone: str):
+    if default_proxy_pool and phone in _temporary_proxies:
+        _temporary_proxies.discard(phone)
+        default_proxy_pool.release(phone)
+
+
+async def get_static_client_for_phone(phone: str) -> TelegramClient:
+    """登录用的临时客户端, 用完后通过 disconnect_static_client 断开并释放代理"""
+    session = await session_store.build(settings.TELEGRAM_SESSIONS_ROOT, phone)
+    return TelegramClient(session, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH,
+                          proxy=_assign_temporary_proxy(phone))
+
+
+async def disconnect_static_client(client: TelegramClient, phone: str):
+    try:
+        if client.is_connected():
+            await client.disconnect()
+    finally:
+        release_temporary_proxy(phone)
+
+
+async def fetch_session_user(session: MemorySession, phone: str, timeout: float) -> types.User | None:
+    """用导入的会话临时连接一次, 未授权时返回 None; timeout 限制整个连接与查询过程"""
+    client = TelegramClient(session, settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH,
+                            proxy=_assign_temporary_proxy(phone), receive_updates=False)
+
+    async def fetch() -> types.User | None:
+        await client.connect()
+        if not await client.is_user_authorized():
+            return None
+        return await client.get_me()
+
+    try:
+        return await asyncio.wait_for(fetch(), timeout)
+    finally:
+        await disconnect_static_client(client, phone)
 
 
 async def create_channel(client: TelegramClient, title: str, about: str = '') -> types.Channel:
@@ -159,53 +894,246 @@ async def create_channel(client: TelegramClient, title: str, about: str = '') ->
     return new_channel
 
 
-async def set_channel_username(client: TelegramClient, tid: int, access_hash: int, username: str) -> bool:
-    input_channel = types.InputChannel(tid, access_hash)
-
-    await client(
-        functions.channels.UpdateUsernameRequest(
-            channel=input_channel,
-            username=username
-        )
+def set_channel_username_request(
+        input_channel: types.InputChannel,
+        username: str,
+) -> functions.channels.UpdateUsernameRequest:
+    return functions.channels.UpdateUsernameRequest(
+        channel=input_channel,
+        username=username
     )
 
+
+async def set_channel_username(client: TelegramClient, input_channel: types.InputChannel, username: str) -> bool:
+    await client(set_channel_username_request(input_channel, username))
+
     return True
 
 
-async def set_channel_photo(client: TelegramClient, tid: int, access_hash: int, photo_path: str) -> bool:
-    input_channel = types.InputChannel(tid, access_hash)
-    uploaded_photo = await client.upload_file(photo_path)
-    chat_upload_photo = types.InputChatUploadedPhoto(uploaded_photo)
+# 超过 10MB 的文件必须使用 SaveBigFilePartRequest 上传
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+
+def _read_part(path: str, offset: int, size: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def _md5_file(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def fast_upload_file(
+        client: TelegramClient,
+        path: str,
+        part_size_kb: int | None = None,
+        concurrency: int | None = None,
+) -> InputFileType:
+    """
+    与 client.upload_file 等价, 但同时发送多个分片, 不再逐个等待上一个分片的响应.
+    """
+    part_size = (part_size_kb or settings.UPLOAD_PART_SIZE_KB) * 1024
+    if part_size % 1024 or 512 * 1024 % part_size:
+        raise ValueError(f'分片大小必须整除 512KB: {part_size_kb}')
+
+    file_size = os.path.getsize(path)
+    part_count = max(1, (file_size + part_size - 1) // part_size)
+    is_big = file_size > BIG_FILE_SIZE
+    file_id = random.getrandbits(63)
+    semaphore = asyncio.Semaphore(concurrency or settings.UPLOAD_CONCURRENCY)
+
+    async def send_part(index: int):
+        async with semaphore:
+            data = await asyncio.to_thread(_read_part, path, index * part_size, part_size)
+            if is_big:
+                request = functions.upload.SaveBigFilePartRequest(file_id, index, part_count, data)
+            else:
+                request = functions.upload.SaveFilePartRequest(file_id, index, data)
+            if not await client(request):
+                raise ValueError(f'上传 {path} 的第 {index} 个分片失败')
+
+    await asyncio.gather(*[send_part(index) for index in range(part_count)])
+
+    name = os.path.basename(path)
+    if is_big:
+        return types.InputFileBig(file_id, part_count, name)
+    return types.InputFile(file_id, part_count, name, await asyncio.to_thread(_md5_file, path))
+
+
+async def upload_media(
+        client: TelegramClient,
+        path: str,
+        upload: Callable[[str], Awaitable[InputFileType]] | None = None,
+) -> types.InputMediaUploadedPhoto | types.InputMediaUploadedDocument:
+    """上传文件并按类型包装成可直接发送的媒体, 视频等文档的属性与 send_file 自动生成的一致"""
+    input_file = await upload(path) if upload else await fast_upload_file(client, path)
+    if utils.is_image(path):
+        return types.InputMediaUploadedPhoto(input_file)
+    attributes, mime_type = utils.get_attributes(path, supports_streaming=True)
+    return types.InputMediaUploadedDocument(input_file, mime_type, attributes)
+
 
-    await client(
+def _new_messages(result: types.TypeUpdates) -> List[types.Message | types.MessageService]:
+    return [
+        update.message for update in getattr(result, 'updates', [])
+        if isinstance(update, (types.UpdateNewChannelMessage, types.UpdateNewMessage))
+    ]
+
+
+async def set_channel_photo(
+        client: TelegramClient,
+        input_channel: types.InputChannel,
+        photo_path: str,
+        upload_cache: UploadCache | None = None,
+        session_name: str = '',
+) -> bool:
+    if upload_cache is None:
+        uploaded_photo = await fast_upload_file(client, photo_path)
+    else:
+        # 优先复用该账号之前设置过的同一张头像, file_reference 过期时从原消息刷新一次
+        input_photo = await upload_cache.get_media(session_name, photo_path)
+        for _ in range(2):
+            if input_photo is None:
+                break
+            try:
+                await client(
+                    functions.channels.EditPhotoRequest(
+                        channel=input_channel,
+                        photo=types.InputChatPhoto(input_photo)
+                    )
+                )
+                return True
+            except errors.FileReferenceExpiredError:
+                input_photo = await upload_cache.refresh_media(client, session_name, photo_path)
+        uploaded_photo = await upload_cache.upload_file(client, session_name, photo_path)
+
+    result = await client(
         functions.channels.EditPhotoRequest(
             channel=input_channel,
-            photo=chat_upload_photo
+            photo=types.InputChatUploadedPhoto(uploaded_photo)
         )
     )
 
+    if upload_cache is not None:
+        peer = types.InputPeerChannel(input_channel.channel_id, input_channel.access_hash)
+        for message in _new_messages(result):
+            await upload_cache.remember_media(session_name, photo_path, media_from_message(message), (peer, message.id))
+
     return True
 
 
-async def set_channel_description(client: TelegramClient, tid: int, access_hash: int, about: str) -> bool:
-    input_peer_channel = types.InputPeerChannel(tid, access_hash)
+def set_channel_description_request(
+        input_channel: types.InputChannel,
+        about: str,
+) -> functions.messages.EditChatAboutRequest:
+    input_peer_channel = types.InputPeerChannel(input_channel.channel_id, input_channel.access_hash)
 
-    await client(
-        functions.messages.EditChatAboutRequest(
-            peer=input_peer_channel,
-            about=about
-        )
+    return functions.messages.EditChatAboutRequest(
+        peer=input_peer_channel,
+        about=about
     )
 
+
+async def set_channel_description(client: TelegramClient, input_channel: types.InputChannel, about: str) -> bool:
+    await client(set_channel_description_request(input_channel, about))
+
     return True
 
 
-async def send_message_to_channel(client: TelegramClient, tid: int, message: str):
-    await client.send_message(tid, message)
+# 新增管理员的默认权限: 可修改频道资料和发布、管理消息, 但不能再添加其他管理员
+CHANNEL_ADMIN_RIGHTS = types.ChatAdminRights(
+    change_info=True,
+    post_messages=True,
+    edit_messages=True,
+    delete_messages=True,
+    invite_users=True,
+    pin_messages=True,
+    manage_call=True,
+    other=True,
+)
+
+
+async def resolve_input_user(client: TelegramClient, username: str | None, phone: str) -> types.InputUser:
+    """按用户名(没有时按手机号)解析出当前账号视角下的 InputUser, access_hash 与账号绑定"""
+    if username:
+        resolved = await client(functions.contacts.ResolveUsernameRequest(username))
+    else:
+        resolved = await client(functions.contacts.ResolvePhoneRequest(phone.lstrip('+')))
+    for user in resolved.users:
+        if isinstance(user, types.User):
+            return utils.get_input_user(user)
+    raise ValueError(f'无法解析用户: {username or phone}')
+
+
+async def add_channel_admin(
+        client: TelegramClient,
+        input_channel: types.InputChannel,
+        username: str | None,
+        phone: str,
+) -> bool:
+    input_user = await resolve_input_user(client, username, phone)
+    await client(functions.channels.EditAdminRequest(
+        channel=input_channel,
+        user_id=input_user,
+        admin_rights=CHANNEL_ADMIN_RIGHTS,
+        rank='',
+    ))
+
+    return True
+
+
+async def invoke_batch(client: TelegramClient, requests: List[TLRequest]) -> List[Any]:
+    """
+    将多个请求放入一个 MTProto 容器发送, 按请求顺序返回每个请求的结果; 失败的请求对应位置为异常对象.
+    """
+    try:
+        return await client(requests, ordered=False)
+    except errors.MultiError as e:
+        return [exc if exc is not None else result for result, exc in zip(e.results, e.exceptions)]
+
+
+async def send_message_to_channel(client: TelegramClient, peer: types.InputPeerChannel | int, message: str):
+    await client.send_message(peer, message)
+
+
+async def send_file_to_channel(
+        client: TelegramClient,
+        peer: types.InputPeerChannel | int,
+        media_list: List[str],
+        caption: str,
+        upload_cache: UploadCache | None = None,
+        session_name: str = '',
+):
+    # 相册中的多个文件同时上传
+    if upload_cache is None:
+        files = await asyncio.gather(*[upload_media(client, path) for path in media_list])
+        await client.send_file(peer, file=list(files), caption=caption)
+        return
+
+    upload = partial(upload_cache.upload_file, client, session_name)
+
+    async def prepare(path: str, media: types.InputPhoto | types.InputDocument | None):
+        return media if media is not None else await upload_media(client, path, upload)
 
+    cached = [await upload_cache.get_media(session_name, path) for path in media_list]
+    try:
+        files = await asyncio.gather(*[prepare(path, media) for path, media in zip(media_list, cached)])
+        result = await client.send_file(peer, file=list(files), caption=caption)
+    except errors.FileReferenceExpiredError:
+        cached = [await upload_cache.refresh_media(client, session_name, path) for path in media_list]
+        files = await asyncio.gather(*[prepare(path, media) for path, media in zip(media_list, cached)])
+        result = await client.send_file(peer, file=list(files), caption=caption)
 
-async def send_file_to_channel(client: TelegramClient, tid: int, media_list: List[str], caption: str):
-    await client.send_file(tid, file=media_list, caption=caption)
+    # 本次新上传的文件, 记下返回的媒体供之后复用
+    messages = result if isinstance(result, list) else [result]
+    for path, media, message in zip(media_list, cached, messages):
+        if media is None:
+            await upload_cache.remember_media(session_name, path, media_from_message(message), (peer, message.id))
 
 
 async def fetch_latest_channels(client: TelegramClient) -> List[types.Channel]:
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, Tuple, Any, Callable, Awaitable
+
+from telethon import TelegramClient, types, utils
+
+logger = logging.getLogger(__name__)
+
+InputMedia = types.InputPhoto | types.InputDocument
+InputFileType = types.InputFile | types.InputFileBig
+Uploader = Callable[[TelegramClient, str], Awaitable[InputFileType]]
+
+
+class CachedUpload:
+    def __init__(self, size: int):
+        self.size = size
+        self.input_file: InputFileType | None = None
+        self.uploaded_at = 0.0
+        # 发送成功后 Telegram 返回的媒体, 以及所在的消息, 用于 file_reference 过期后重新获取
+        self.media: InputMedia | None = None
+        self.origin: Tuple[Any, int] | None = None
+
+
+class UploadCache:
+    """
+    按 (账号, 文件内容哈希) 复用上传结果:
+    在 reuse_window 秒内直接复用已上传的 InputFile, 发送成功后复用返回的 InputPhoto/InputDocument.
+    """
+
+    def __init__(self, reuse_window: int, uploader: Uploader | None = None):
+        self.reuse_window = reuse_window
+        self.uploader = uploader
+        self.entries: Dict[Tuple[str, str], CachedUpload] = {}
+        self._digests: Dict[Tuple[str, float, int], str] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    async def content_hash(self, path: str) -> Tuple[str, int]:
+        # 媒体文件以 uuid 命名且不会被修改, 按 (路径, 修改时间, 大小) 缓存哈希避免重复读取大文件
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = await asyncio.to_thread(self._hash_file, path)
+            self._digests[key] = digest
+        return digest, stat.st_size
+
+    async def entry(self, session_name: str, path: str) -> Tuple[str, CachedUpload]:
+        digest, size = await self.content_hash(path)
+        cached = self.entries.get((session_name, digest))
+        if cached is None:
+            cached = CachedUpload(size)
+            self.entries[(session_name, digest)] = cached
+        return digest, cached
+
+    def _hit(self, cached: CachedUpload):
+        self.hits += 1
+        self.bytes_saved += cached.size
+
+    async def get_media(self, session_name: str, path: str) -> InputMedia | None:
+        _, cached = await self.entry(session_name, path)
+        if cached.media is None:
+            return None
+        self._hit(cached)
+        return cached.media
+
+    async def upload_file(self, client: TelegramClient, session_name: str, path: str) -> InputFileType:
+        _, cached = await self.entry(session_name, path)
+        if cached.input_file is not None and time.monotonic() - cached.uploaded_at < self.reuse_window:
+            self._hit(cached)
+            return cached.input_file
+
+        self.misses += 1
+        if self.uploader is not None:
+            cached.input_file = await self.uploader(client, path)
+        else:
+            cached.input_file = await client.upload_file(path)
+        cached.uploaded_at = time.monotonic()
+        return cached.input_file
+
+    async def remember_media(self, session_name: str, path: str, media: InputMedia | None, origin: Tuple[Any, int]):
+        if media is None:
+            return
+        _, cached = await self.entry(session_name, path)
+        cached.media = media
+        cached.origin = origin
+
+    async def refresh_media(self, client: TelegramClient, session_name: str, path: str) -> InputMedia | None:
+        """file_reference 过期时从原消息重新获取媒体, 失败则丢弃缓存, 由调用方重新上传"""
+        _, cached = await self.entry(session_name, path)
+        media = None
+        if cached.origin is not None:
+            peer, message_id = cached.origin
+            try:
+                message = await client.get_messages(peer, ids=message_id)
+                media = media_from_message(message)
+            except Exception as e:
+                logger.warning(f'{session_name} 刷新 {path} 的 file_reference 失败: {e}')
+
+        cached.media = media
+        if media is None:
+            cached.origin = None
+        return media
+
+    def drop(self, session_name: str):
+        for key in [key for key in self.entries if key[0] == session_name]:
+            del self.entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytes_saved': self.bytes_saved,
+        }
+
+
+def media_from_message(message: types.Message | types.MessageService | None) -> InputMedia | None:
+    if message is None:
+        return None
+    if isinstance(message, types.MessageService):
+        photo = getattr(message.action, 'photo', None)
+        return utils.get_input_photo(photo) if isinstance(photo, types.Photo) else None
+    if isinstance(message.media, types.MessageMediaPhoto) and isinstance(message.media.photo, types.Photo):
+        return utils.get_input_photo(message.media.photo)
+    if isinstance(message.media, types.MessageMediaDocument) and isinstance(message.media.document, types.Document):
+        return utils.get_input_document(message.media.document)
+    return None
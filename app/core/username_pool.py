@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+from telethon import functions, types, errors
+
+from app.core.config import settings
+from app.exceptions import RateLimitedError
+from app.utils.channel_tools import generate_username_prefix
+from .telegram_client import ClientManager
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # 双重哈希: 用一次摘要的两半模拟 k 个独立哈希函数
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UsernamePool:
+    """
+    后台用 channels.CheckUsernameRequest 预先验证候选用户名, 维护一个可用用户名池, 设置频道用户名时直接从池中取用;
+    已被占用的用户名记入布隆过滤器, 之后生成的候选命中时直接跳过, 不再消耗检查请求.
+    检查请求经过 ClientManager 的限流, 某个账号被限流时换用其他账号, 全部被限流时等下一轮再补充.
+    """
+
+    def __init__(self, size: int, ttl: int, taken_capacity: int):
+        self.size = size
+        self.ttl = ttl
+        self.available: Deque[Tuple[str, float]] = deque()
+        self.taken = BloomFilter(taken_capacity)
+
+        self.checked = 0
+        self.rejected = 0
+        self.skipped = 0
+        self._refill_task: asyncio.Task | None = None
+
+    def candidate(self) -> str:
+        pooled = {username for username, _ in self.available}
+        while True:
+            username = f'{generate_username_prefix()}{random.randint(1000, 99999999)}'
+            if '__' in username or username in pooled:
+                continue
+            if username in self.taken:
+                self.skipped += 1
+                continue
+            return username
+
+    def take(self) -> str | None:
+        # 验证过久的用户名可能已被他人占用, 直接丢弃
+        deadline = time.monotonic() - self.ttl
+        while self.available:
+            username, checked_at = self.available.popleft()
+            if checked_at >= deadline:
+                # 取出即视为已占用, 避免重复生成
+                self.taken.add(username)
+                return username
+        return None
+
+    def mark_taken(self, username: str):
+        self.taken.add(username.lower())
+
+    async def _check(self, client_manager: ClientManager, session_name: str, username: str) -> bool:
+        async with client_manager.get_client(session_name, method='CheckUsernameRequest') as client:
+            try:
+                return await client(functions.channels.CheckUsernameRequest(types.InputChannelEmpty(), username))
+            except (errors.UsernameInvalidError, errors.UsernameOccupiedError):
+                return False
+
+    async def refill(self, client_manager: ClientManager):
+        # 优先使用已连接的账号, 避免为检查用户名建立新连接
+        session_names = list(client_manager.clients) or sorted(client_manager.registered)
+        random.shuffle(session_names)
+
+        added = 0
+        while len(self.available) < self.size and session_names:
+            session_name = session_names[0]
+            username = self.candidate()
+            try:
+                free = await self._check(client_manager, session_name, username)
+            except RateLimitedError:
+                session_names.pop(0)
+                continue
+            except errors.BadRequestError as e:
+                # 其他 400 错误(如用户名仅可拍卖购买)同样说明该用户名不可用
+                logger.debug(f'用户名 {username} 不可用: {e}')
+                free = False
+            except Exception as e:
+                logger.error(f'{session_name} 检查用户名 {username} 失败: {e}')
+                session_names.pop(0)
+                continue
+
+            self.checked += 1
+            if free:
+                self.available.append((username, time.monotonic()))
+                added += 1
+            else:
+                self.rejected += 1
+                self.taken.add(username)
+            # 轮换账号, 分散检查请求
+            session_names.append(session_names.pop(0))
+
+        if added:
+            logger.info(
+                f'用户名池已补充 {added} 个可用用户名, 当前 {len(self.available)} 个; '
+                f'累计检查 {self.checked} 个, 已占用 {self.rejected} 个, 布隆过滤器跳过 {self.skipped} 个'
+            )
+
+    async def _refill_forever(self, client_manager: ClientManager, interval: int):
+        while True:
+            try:
+                await self.refill(client_manager)
+            except Exception as e:
+                logger.error(f'补充用户名池时发生错误: {e}')
+            await asyncio.sleep(interval)
+
+    def start(self, client_manager: ClientManager, interval: int):
+        if self.size and self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill_forever(client_manager, interval))
+
+    def stop(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+
+
+username_pool = UsernamePool(
+    settings.USERNAME_POOL_SIZE,
+    settings.USERNAME_POOL_TTL,
+    settings.USERNAME_TAKEN_CAPACITY,
+)
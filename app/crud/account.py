@@ -1,6 +1,9 @@
 # crud/account.py
 
-from typing import List
+from typing import List, Dict
+
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 
 from app.db.models import AccountModel
 from .base import BaseCRUD
@@ -13,6 +16,9 @@ class AccountCRUD(BaseCRUD[AccountModel]):
     async def get_by_phone(self, phone: str) -> AccountModel | None:
         return await self.model.filter(phone=phone).first()
 
+    async def get_by_session_name(self, session_name: str) -> AccountModel | None:
+        return await self.model.filter(session_name=session_name).first()
+
     async def get_related_user(self, account_id: int) -> AccountModel | None:
         return await self.model.filter(id=account_id).select_related('user').first()
 
@@ -27,3 +33,39 @@ class AccountCRUD(BaseCRUD[AccountModel]):
 
     async def list_authenticated(self) -> List[AccountModel]:
         return await self.model.filter(is_authenticated=True)
+
+    async def list_authenticated_by_ids(self, ids: List[int]) -> List[AccountModel]:
+        if not ids:
+            return []
+        return await self.model.filter(id__in=ids, is_authenticated=True)
+
+    async def list_by_phones(self, phones: List[str]) -> List[AccountModel]:
+        if not phones:
+            return []
+        return await self.model.filter(phone__in=phones)
+
+    async def list_by_tids_or_usernames(self, tids: List[int], usernames: List[str]) -> List[AccountModel]:
+        if not tids and not usernames:
+            return []
+        return await self.model.filter(Q(tid__in=tids) | Q(username__in=usernames))
+
+    async def bulk_import(self, to_create: List[AccountModel], to_update: List[AccountModel]):
+        async with in_transaction():
+            if to_create:
+                await self.model.bulk_create(to_create, batch_size=500)
+            if to_update:
+                await self.model.bulk_update(
+                    to_update, fields=['tid', 'username', 'two_fa', 'is_authenticated'], batch_size=500
+                )
+
+    async def update_online_by_session_names(self, session_names: List[str], online: bool) -> int:
+        if not session_names:
+            return 0
+        return await self.model.filter(session_name__in=session_names).update(online=online)
+
+    async def update_health_scores(self, scores: Dict[str, float]):
+        accounts = await self.model.filter(session_name__in=list(scores))
+        for account in accounts:
+            account.health_score = scores[account.session_name]
+        if accounts:
+            await self.model.bulk_update(accounts, fields=['health_score'], batch_size=500)
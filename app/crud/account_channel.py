@@ -1,3 +1,5 @@
+from typing import List, Tuple, Dict, Any
+
 from app.db.models.channel import AccountChannelModel
 from app.db.models.account import AccountModel
 from .base import BaseCRUD
@@ -13,5 +15,43 @@ class AccountChannelCRUD(BaseCRUD):
     async def get_with_channel_account(self, channel_id: int) -> AccountModel | None:
         return await self.model.filter(channel_id=channel_id).select_related('channel', 'account').first()
 
+    async def list_with_channel_account_by_channel_ids(self, channel_ids: List[int]) -> List[AccountChannelModel]:
+        if not channel_ids:
+            return []
+        return await self.model.filter(channel_id__in=channel_ids).select_related('channel', 'account')
+
+    async def list_account_ids_by_channel_ids(self, channel_ids: List[int]) -> List[Tuple[int, int]]:
+        if not channel_ids:
+            return []
+        return await self.model.filter(channel_id__in=channel_ids).values_list('channel_id', 'account_id')
+
     async def get_by_channel_id_and_account_id(self, channel_id: int, account_id: int) -> AccountModel | None:
-        return await self.model.filter(channel_id=channel_id, account_id=account_id).first()
\ No newline at end of file
+        return await self.model.filter(channel_id=channel_id, account_id=account_id).first()
+
+    async def list_by_account_id(self, account_id: int) -> List[AccountChannelModel]:
+        return await self.model.filter(account_id=account_id)
+
+    async def list_with_channel_by_account_id(self, account_id: int) -> List[AccountChannelModel]:
+        return await self.model.filter(account_id=account_id).select_related('channel')
+
+    async def bulk_update_health(self, links: List[AccountChannelModel]):
+        if links:
+            await self.model.bulk_update(links, fields=['admin_rights', 'is_accessible'], batch_size=500)
+
+    async def bulk_upsert(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        await self.model.bulk_create(
+            [self.model(**row) for row in rows],
+            on_conflict=['account_id', 'channel_id'],
+            update_fields=['role', 'access_hash', 'updated_at'],
+        )
+
+    async def delete_by_account_id_and_channel_tid(self, account_id: int, channel_tid: int) -> int:
+        ids = await self.model.filter(account_id=account_id, channel__tid=channel_tid).values_list('id', flat=True)
+        if not ids:
+            return 0
+        return await self.model.filter(id__in=ids).delete()
+
+    async def list_peers_by_session_name(self, session_name: str) -> List[Tuple[int, int]]:
+        return await self.model.filter(account__session_name=session_name).values_list('channel__tid', 'access_hash')
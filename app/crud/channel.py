@@ -14,6 +14,35 @@ class ChannelCRUD(BaseCRUD[ChannelModel]):
     async def get_by_tid(self, tid: int) -> ChannelModel | None:
         return await self.model.filter(tid=tid).first()
 
+    async def list_by_tids(self, tids: List[int]) -> List[ChannelModel]:
+        if not tids:
+            return []
+        return await self.model.filter(tid__in=tids)
+
+    async def get_ids_by_tids(self, tids: List[int]) -> Dict[int, int]:
+        if not tids:
+            return {}
+        return dict(await self.model.filter(tid__in=tids).values_list('tid', 'id'))
+
+    async def bulk_upsert_by_tid(self, rows: List[Dict[str, Any]], update_fields: List[str]):
+        if not rows:
+            return
+        await self.model.bulk_create(
+            [self.model(**row) for row in rows],
+            on_conflict=['tid'],
+            update_fields=[*update_fields, 'updated_at'],
+        )
+
+    async def bulk_update_health(self, channels: List[ChannelModel]):
+        if channels:
+            await self.model.bulk_update(channels, fields=['is_banned', 'restriction_reason'], batch_size=500)
+
+    async def get_photo_ids_by_tids(self, tids: List[int]) -> Dict[int, Tuple[int | None, int | None]]:
+        if not tids:
+            return {}
+        rows = await self.model.filter(tid__in=tids).values_list('tid', 'photo_id', 'photo_dc_id')
+        return {tid: (photo_id, photo_dc_id) for tid, photo_id, photo_dc_id in rows}
+
     async def create_or_update_by_tid(self, tid: int, data: Dict[str, Any]) -> Tuple[ChannelModel | None, int]:
         channel = await self.get_by_tid(tid)
 
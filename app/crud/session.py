@@ -0,0 +1,24 @@
+from typing import List, Dict, Any
+
+from app.db.models.session import TelegramSessionModel
+from .base import BaseCRUD
+
+
+class TelegramSessionCRUD(BaseCRUD[TelegramSessionModel]):
+    def __init__(self):
+        super().__init__(TelegramSessionModel)
+
+    async def get_by_session_name(self, session_name: str) -> TelegramSessionModel | None:
+        return await self.model.filter(session_name=session_name).first()
+
+    async def bulk_upsert(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        await self.model.bulk_create(
+            [self.model(**row) for row in rows],
+            on_conflict=['session_name'],
+            update_fields=['dc_id', 'server_address', 'port', 'auth_key', 'takeout_id', 'entities'],
+        )
+
+    async def delete_by_session_name(self, session_name: str) -> int:
+        return await self.model.filter(session_name=session_name).delete()
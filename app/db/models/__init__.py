@@ -4,6 +4,7 @@ from .task import TaskModel
 from .user import UserModel
 from .media import MediaModel
 from .schedule import ScheduleModel
+from .session import TelegramSessionModel
 
 __all__ = [
     'UserModel',
@@ -13,4 +14,5 @@ __all__ = [
     'TaskModel',
     'MediaModel',
     'ScheduleModel',
+    'TelegramSessionModel',
 ]
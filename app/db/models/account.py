@@ -12,6 +12,10 @@ class AccountModel(BaseModel):
     session_name = fields.CharField(unique=True, max_length=16)
     is_authenticated = fields.BooleanField(default=False)
     online = fields.BooleanField(default=False)
+    # 是否接收 Telegram 推送的更新; 只执行任务的账号关闭后不再解析更新流
+    receive_updates = fields.BooleanField(default=False)
+    # 根据调用结果和耗时统计的滚动健康分(0~1), 由引擎定期写回
+    health_score = fields.FloatField(default=1.0)
 
     user = fields.ForeignKeyField('models.UserModel', related_name='accounts', on_delete=fields.CASCADE)
 
@@ -10,12 +10,16 @@ class ChannelModel(BaseModel):
     username = fields.CharField(unique=True, max_length=64, null=True)
     link = fields.CharField(unique=True, max_length=255, null=True)
     photo = fields.TextField(null=True)
+    # Telegram 头像标识, 未变化时同步不再重复下载
+    photo_id = fields.BigIntField(null=True)
+    photo_dc_id = fields.IntField(null=True)
     description = fields.TextField(null=True)
 
     lang = fields.CharField(max_length=16, null=True)
     primary_link = fields.TextField(null=True)
 
     is_banned = fields.BooleanField(default=False)
+    restriction_reason = fields.TextField(null=True)
 
     user = fields.ForeignKeyField('models.UserModel', related_name='channels', on_delete=fields.CASCADE)
 
@@ -28,6 +32,10 @@ class AccountChannelModel(BaseModel):
     channel = fields.ForeignKeyField('models.ChannelModel', related_name='accounts_channels', on_delete=fields.CASCADE)
     role = fields.IntEnumField(AccountRole)
     access_hash = fields.BigIntField()
+    # 由频道健康检查更新: 账号在频道中的管理员权限, 以及账号是否还能管理该频道
+    admin_rights = fields.JSONField(null=True)
+    is_accessible = fields.BooleanField(default=True)
 
     class Meta:
         table = "accounts_channels"
+        unique_together = (('account', 'channel'),)
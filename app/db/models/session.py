@@ -0,0 +1,17 @@
+from tortoise import fields
+
+from app.db.base import BaseModel
+
+
+# Telethon 会话: 授权密钥、数据中心以及实体缓存
+class TelegramSessionModel(BaseModel):
+    session_name = fields.CharField(unique=True, max_length=64)
+    dc_id = fields.IntField(default=0)
+    server_address = fields.CharField(max_length=64, null=True)
+    port = fields.IntField(null=True)
+    auth_key = fields.BinaryField(null=True)
+    takeout_id = fields.BigIntField(null=True)
+    entities = fields.JSONField(default=list)
+
+    class Meta:
+        table = "telegram_sessions"
@@ -60,4 +60,16 @@ class UnAuthenticatedError(Exception):
 
 
 class LaunchAccountError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class RateLimitedError(Exception):
+    def __init__(self, seconds: float, message: str = '', retry_data: tuple | None = None):
+        self.seconds = seconds
+        # 重试时代替原任务数据放回队列, 用于保留已完成的准备工作(如已生成的消息)
+        self.retry_data = retry_data
+        super().__init__(message or f'请求过于频繁, 需等待 {seconds:.0f} 秒')
+
+
+class ProxyUnavailableError(Exception):
+    pass
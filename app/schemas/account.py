@@ -1,9 +1,12 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
 
 class AccountCreate(BaseModel):
     phone: str
     two_fa: str
+    receive_updates: bool = False
 
 
 class AccountOut(BaseModel):
@@ -14,6 +17,8 @@ class AccountOut(BaseModel):
     session_name: str
     is_authenticated: bool
     online: bool
+    receive_updates: bool
+    health_score: float
 
     model_config = {
         'from_attributes': True
@@ -29,10 +34,36 @@ class SendCodeOut(BaseModel):
     phone_code_hash: str
 
 
+class BatchSendCode(BaseModel):
+    account_ids: List[int]
+
+
+class BatchSendCodeOut(BaseModel):
+    account_id: int
+    phone_code_hash: str | None = Field(None)
+    error: str | None = Field(None)
+
+
 class AccountSignInOut(AccountOut):
     pass
 
 
+class AccountImport(BaseModel):
+    phone: str
+    two_fa: str = ''
+    string_session: str
+
+
+class AccountImportError(BaseModel):
+    phone: str
+    error: str
+
+
+class AccountImportOut(BaseModel):
+    imported: int
+    failed: List[AccountImportError]
+
+
 class AccountFilter(BaseModel):
     user_id: int | None = Field(None)
     status: int | None = Field(None)
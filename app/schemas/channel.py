@@ -13,6 +13,8 @@ class ChannelResponse(BaseModel):
     description: str | None = Field(None)
     lang: str | None = Field(None)
     primary_link: str | None = Field(None)
+    is_banned: bool = False
+    restriction_reason: str | None = Field(None)
 
     model_config = {
         'from_attributes': True
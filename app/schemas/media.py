@@ -21,3 +21,10 @@ class MediaFilter(BaseModel):
     user_id: int | None = Field(None)
     filename: str | None = None
     m_type: MediaType | None = Field(None)
+
+
+class UploadCacheStatsOut(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    bytes_saved: int
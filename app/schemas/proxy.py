@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+
+
+class ProxyStatsOut(BaseModel):
+    proxy: str
+    healthy: bool
+    sessions: int
+    max_connections: int
+    latency_ms: float | None = Field(None)
+    successes: int
+    errors: int
+    last_checked_at: float | None = Field(None)
+    shard: int | None = Field(None)
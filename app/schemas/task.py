@@ -48,6 +48,12 @@ class BatchSetChannelPhotoArgs(BaseModel):
     channel_ids: List[int] = Field(..., min_length=1)
 
 
+class BatchSetChannelAccountArgs(BaseModel):
+    channel_ids: List[int] = Field(..., min_length=1)
+    # 要添加为频道管理员的账号
+    account_ids: List[int] = Field(..., min_length=1)
+
+
 class BatchSetChannelDescriptionArgs(BaseModel):
     channel_ids: List[int] = Field(..., min_length=1)
     description: str
@@ -1,10 +1,20 @@
+import asyncio
 import logging
-from typing import List
+import re
+import tempfile
+from pathlib import Path
+from typing import List, Tuple, Dict, Any
+
+from fastapi import UploadFile
 
 from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError
+from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
 
-from app.core.telegram_client import get_static_client_for_phone, ClientManager
+from app.core.config import settings
+from app.core.pending_login import pending_logins
+from app.core.session_storage import session_store, session_from_data, read_string_session, read_sqlite_session
+from app.core.telegram_client import get_static_client_for_phone, ClientManager, fetch_session_user, \
+    disconnect_static_client
 from app.crud.account import AccountCRUD
 from app.db.models.account import AccountModel
 from app.exceptions import AlreadyExistError, AlreadyAuthenticatedError, GetClientError, UpdateRecordError, \
@@ -14,11 +24,17 @@ from app.schemas.account import (AccountCreate,
                                  AccountOut,
                                  AccountFilter,
                                  SendCodeOut,
-                                 AccountSignIn, AccountSignInOut)
+                                 BatchSendCodeOut,
+                                 AccountSignIn, AccountSignInOut,
+                                 AccountImport, AccountImportError, AccountImportOut)
 from app.schemas.common import PageResponse
 
 logger = logging.getLogger(__name__)
 
+# 手机号同时用作会话名, 受 accounts.phone / session_name 的长度限制
+PHONE_PATTERN = re.compile(r'^\+?\d{5,15}$')
+TWO_FA_MAX_LENGTH = 32
+
 
 class AccountService:
     def __init__(self):
@@ -65,9 +81,9 @@ class AccountService:
         return account
 
     @staticmethod
-    def get_account_client(phone: str) -> TelegramClient:
+    async def get_account_client(phone: str) -> TelegramClient:
         try:
-            return get_static_client_for_phone(phone)
+            return await get_static_client_for_phone(phone)
         except Exception as e:
             raise GetClientError(e) from e
 
@@ -78,16 +94,33 @@ class AccountService:
 
     async def send_code(self, user_id: int, account_id: int) -> SendCodeOut:
         account = await self.get_user_account(user_id, account_id)
-        client = self.get_account_client(account.phone)
-        await client.connect()
+        client = await self.get_account_client(account.phone)
 
         try:
+            await client.connect()
             await self.ensure_not_authenticated(client, account)
             sent_code_response = await client.send_code_request(account.phone)
-            return SendCodeOut(phone_code_hash=sent_code_response.phone_code_hash)
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+        except Exception:
+            await disconnect_static_client(client, account.phone)
+            raise
+
+        # 保持连接, sign_in 时复用
+        await pending_logins.put(account.phone, client, sent_code_response.phone_code_hash)
+        return SendCodeOut(phone_code_hash=sent_code_response.phone_code_hash)
+
+    async def send_codes(self, user_id: int, account_ids: List[int]) -> List[BatchSendCodeOut]:
+        semaphore = asyncio.Semaphore(settings.LOGIN_BATCH_CONCURRENCY)
+
+        async def send(account_id: int) -> BatchSendCodeOut:
+            async with semaphore:
+                try:
+                    sent = await self.send_code(user_id, account_id)
+                    return BatchSendCodeOut(account_id=account_id, phone_code_hash=sent.phone_code_hash)
+                except Exception as e:
+                    logger.error(f'账号 {account_id} 发送验证码失败: {e}')
+                    return BatchSendCodeOut(account_id=account_id, error=str(e))
+
+        return list(await asyncio.gather(*[send(account_id) for account_id in account_ids]))
 
     async def sign_in(
             self,
@@ -96,21 +129,33 @@ class AccountService:
             data_to_complete: AccountSignIn
     ) -> AccountSignInOut:
         account = await self.get_user_account(user_id, account_id)
-        client = self.get_account_client(account.phone)
-        await client.connect()
+        client = await pending_logins.pop(account.phone, data_to_complete.phone_code_hash)
+        if client is None:
+            client = await self.get_account_client(account.phone)
 
-        account_info = None
+        keep_pending = False
         try:
+            if not client.is_connected():
+                await client.connect()
             await self.ensure_not_authenticated(client, account)
-            await client.sign_in(phone=account.phone, code=data_to_complete.code,
-                                 phone_code_hash=data_to_complete.phone_code_hash)
-        except SessionPasswordNeededError as e:
-            logger.error(e)
-            await client.sign_in(password=account.two_fa)
+            try:
+                await client.sign_in(phone=account.phone, code=data_to_complete.code,
+                                     phone_code_hash=data_to_complete.phone_code_hash)
+            except SessionPasswordNeededError as e:
+                logger.error(e)
+                await client.sign_in(password=account.two_fa)
             account_info = await client.get_me()
+        except PhoneCodeInvalidError:
+            # 验证码输错时保留连接, 允许用同一个 phone_code_hash 重试
+            keep_pending = True
+            await pending_logins.put(account.phone, client, data_to_complete.phone_code_hash)
+            raise
         finally:
-            if client.is_connected():
-                await client.disconnect()
+            if not keep_pending:
+                await disconnect_static_client(client, account.phone)
+
+        # 立即写回新的授权密钥, 不等待定期 checkpoint, 负责该账号的引擎分片随后即可连接
+        await session_store.flush()
 
         data_to_update = {
             'tid': account_info.id,
@@ -125,6 +170,122 @@ class AccountService:
             raise NotFoundRecordError(f'账号 {account.phone} 在认证过程中被删除')
         return AccountSignInOut.model_validate(updated_account)
 
+    async def import_sessions(self, user_id: int, items: List[Tuple[str, str, Dict[str, Any]]]) -> AccountImportOut:
+        """
+        items 中每一项为 (phone, two_fa, 会话数据), 并发校验会话后批量写入会话存储和账号表.
+        已属于当前用户的账号会被更新为已登录, 属于其他用户的账号会被跳过.
+        """
+        semaphore = asyncio.Semaphore(settings.SESSION_IMPORT_CONCURRENCY)
+        failed: List[AccountImportError] = []
+
+        # 先校验字段, 避免单个无效项让整批写入失败
+        unique_items: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
+        for phone, two_fa, data in items:
+            if not PHONE_PATTERN.match(phone):
+                failed.append(AccountImportError(phone=phone, error='手机号格式无效'))
+            elif len(two_fa or '') > TWO_FA_MAX_LENGTH:
+                failed.append(AccountImportError(phone=phone, error=f'二步验证密码超过 {TWO_FA_MAX_LENGTH} 个字符'))
+            else:
+                # 同一手机号重复出现时以最后一个为准
+                unique_items[phone] = (phone, two_fa, data)
+
+        async def validate(phone: str, two_fa: str, data: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    me = await fetch_session_user(session_from_data(data), phone, settings.ACCOUNT_LAUNCH_TIMEOUT)
+                except Exception as e:
+                    failed.append(AccountImportError(phone=phone, error=str(e)))
+                    return None
+            if me is None:
+                failed.append(AccountImportError(phone=phone, error='会话未登录或已失效'))
+                return None
+            return phone, two_fa, data, me
+
+        validated = [
+            result for result in await asyncio.gather(*[validate(*item) for item in unique_items.values()])
+            if result is not None
+        ]
+
+        existing = {account.phone: account for account in await self.crud.list_by_phones(list(unique_items))}
+        # 同一个 Telegram 账号(tid / 用户名)只能对应一个手机号, 包括批次内和已有账号
+        owners: Dict[Any, str] = {}
+        for account in await self.crud.list_by_tids_or_usernames(
+                [me.id for *_, me in validated], [me.username for *_, me in validated if me.username]
+        ):
+            owners[('tid', account.tid)] = account.phone
+            if account.username:
+                owners[('username', account.username)] = account.phone
+
+        to_create, to_update, sessions = [], [], []
+        for phone, two_fa, data, me in validated:
+            account = existing.get(phone)
+            if account is not None and account.user_id != user_id:
+                failed.append(AccountImportError(phone=phone, error='此账号已被其他用户添加'))
+                continue
+
+            keys = [('tid', me.id)] + ([('username', me.username)] if me.username else [])
+            other = next((owners[key] for key in keys if owners.get(key, phone) != phone), None)
+            if other is not None:
+                failed.append(AccountImportError(phone=phone, error=f'与 {other} 是同一个 Telegram 账号'))
+                continue
+            for key in keys:
+                owners[key] = phone
+
+            if account is None:
+                account = AccountModel(phone=phone, session_name=phone, two_fa=two_fa, user_id=user_id)
+                to_create.append(account)
+            else:
+                to_update.append(account)
+                if two_fa:
+                    account.two_fa = two_fa
+            account.tid = me.id
+            account.username = me.username
+            account.is_authenticated = True
+            sessions.append({**data, 'session_name': account.session_name})
+
+        try:
+            await self.crud.bulk_import(to_create, to_update)
+        except Exception as e:
+            # 账号写入在同一个事务中, 失败时整批回滚, 也不写入任何会话
+            logger.error(f'批量写入导入的账号失败: {e}')
+            failed.extend(AccountImportError(phone=item['session_name'], error=str(e)) for item in sessions)
+            return AccountImportOut(imported=0, failed=failed)
+
+        # 只为成功写入的账号保存会话
+        await session_store.save_all(settings.TELEGRAM_SESSIONS_ROOT, sessions)
+        logger.info(f'导入会话完成: 成功 {len(sessions)} 个, 失败 {len(failed)} 个')
+
+        return AccountImportOut(imported=len(sessions), failed=failed)
+
+    async def import_string_sessions(self, user_id: int, items: List[AccountImport]) -> AccountImportOut:
+        parsed, failed = [], []
+        for item in items:
+            try:
+                parsed.append((item.phone, item.two_fa, read_string_session(item.string_session, item.phone)))
+            except Exception as e:
+                failed.append(AccountImportError(phone=item.phone, error=f'StringSession 无效: {e}'))
+
+        result = await self.import_sessions(user_id, parsed)
+        result.failed.extend(failed)
+        return result
+
+    async def import_session_files(self, user_id: int, files: List[UploadFile]) -> AccountImportOut:
+        """上传的 .session 文件以手机号命名, 如 8613800000000.session"""
+        parsed, failed = [], []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file in files:
+                phone = Path(file.filename or '').stem
+                session_file = Path(tmp_dir) / f'{phone}.session'
+                try:
+                    session_file.write_bytes(await file.read())
+                    parsed.append((phone, '', await asyncio.to_thread(read_sqlite_session, session_file, phone)))
+                except Exception as e:
+                    failed.append(AccountImportError(phone=phone, error=f'会话文件无效: {e}'))
+
+        result = await self.import_sessions(user_id, parsed)
+        result.failed.extend(failed)
+        return result
+
     async def launch(self, user_id: int, account_id: int, client_manager: ClientManager):
         account = await self.get_user_account(user_id, account_id)
 
@@ -134,13 +295,26 @@ class AccountService:
         online = await client_manager.is_online(account.session_name)
 
         if not online:
-            is_launched = await client_manager.connect_client(account.session_name)
+            is_launched = await client_manager.launch_client(
+                account.session_name, receive_updates=account.receive_updates
+            )
             if not is_launched:
                 raise LaunchAccountError('上线失败')
+            # 手动上线视为已确认账号恢复, 健康分从满分重新统计
+            if account.health_score < 1.0:
+                await self.crud.update(account.id, {'health_score': 1.0})
+
+        await client_manager.flush_liveness()
+
+    async def sync_channels(self, user_id: int, account_id: int, client_manager: ClientManager) -> int:
+        account = await self.get_user_account(user_id, account_id)
+
+        if not await client_manager.is_online(account.session_name):
+            raise UnAuthenticatedError('此账号未上线, 请上线后再试')
 
-        await self.crud.update(account.id, {'online': True})
+        return await client_manager.sync_channels(account.session_name)
 
     async def unlaunch(self, user_id: int, account_id: int, client_manager: ClientManager):
         account = await self.get_user_account(user_id, account_id)
         await client_manager.remove_client(account.session_name)
-        await self.crud.update(account.id, {'online': False})
+        await client_manager.flush_liveness()
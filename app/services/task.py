@@ -1,9 +1,10 @@
 import logging
 import random
-from typing import List
+from typing import List, Tuple, Callable
 
 from app.constants.enum import TaskStatus
 from app.constants.enum import TaskType
+from app.core.channel_routing import route_channel_links, is_usable, can_add_admins
 from app.core.config import settings
 from app.core.telegram_client import ClientManager
 from app.crud.account import AccountCRUD
@@ -18,10 +19,8 @@ from app.schemas.account import AccountOut
 from app.schemas.channel import ChannelResponse
 from app.schemas.common import PageResponse
 from app.schemas.task import TaskFilter, TaskResponse, TaskCreate, BatchCreateChannelArgs, BatchSetChannelUsernameArgs, \
-    BatchSetChannelPhotoArgs, BatchSetChannelDescriptionArgs
+    BatchSetChannelPhotoArgs, BatchSetChannelDescriptionArgs, BatchSetChannelAccountArgs
 from app.services.media import MediaService
-from app.task.queues import queue_manager
-from app.utils.channel_tools import generate_username
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +104,15 @@ class TaskService:
         new_task = await self.crud.create(dict_to_create)
         return TaskResponse.model_validate(new_task)
 
+    async def create_set_channel_account_task(self, user_id: int, data: TaskCreate) -> TaskResponse:
+        args = BatchSetChannelAccountArgs.model_validate(data.args)
+        if data.total != len(args.channel_ids) * len(args.account_ids):
+            raise ValueError('请求任务操作总数与选中的频道数量乘以账号数量不符')
+        dict_to_create = data.model_dump()
+        dict_to_create.update({'user_id': user_id})
+        new_task = await self.crud.create(dict_to_create)
+        return TaskResponse.model_validate(new_task)
+
     async def create_task(self, user_id: int, data: TaskCreate) -> TaskResponse:
         t_type = data.t_type
 
@@ -116,9 +124,40 @@ class TaskService:
             return await self.create_set_channel_photo_task(user_id, data)
         if t_type == TaskType.SET_DESCRIPTION:
             return await self.create_set_channel_description_task(user_id, data)
+        if t_type == TaskType.SET_ACCOUNT:
+            return await self.create_set_channel_account_task(user_id, data)
 
         raise UnsupportedTaskTypeError('不支持的任务类型')
 
+    @staticmethod
+    async def split_usable_channel_links(
+            channel_ids: List[int],
+            client_manager: ClientManager,
+            eligible: Callable[[AccountChannelModel], bool] = is_usable,
+    ) -> Tuple[List[AccountChannelModel], List[AccountChannelModel]]:
+        """
+        为每个频道选出负载最低的管理账号, 分为可用和不可用(已被封禁或没有能管理该频道的账号)两组, 不可用的频道不投递到队列.
+        """
+        routed = await route_channel_links(client_manager, channel_ids, eligible)
+        usable: List[AccountChannelModel] = []
+        unusable: List[AccountChannelModel] = []
+        for cid in channel_ids:
+            c2a = routed.get(cid)
+            if c2a is None:
+                raise NotFoundRecordError(f'未查询到此频道相关记录: {cid}')
+            if eligible(c2a):
+                usable.append(c2a)
+            else:
+                unusable.append(c2a)
+        return usable, unusable
+
+    async def skip_unusable_channel_links(self, task_id: int, unusable: List[AccountChannelModel]):
+        # 在任务标记为运行中之后再记录, 全部跳过时任务能正常结束
+        for c2a in unusable:
+            log = f'任务 {task_id} 频道 {c2a.channel.tid} 已被封禁或账号已无管理权限, 已跳过'
+            await self.update_task_status_with_increment_failure_and_log(task_id, log)
+            logger.warning(log)
+
     async def start_batch_create_channel(self, task_schema: TaskResponse, client_manager: ClientManager):
         args = task_schema.args
         total = task_schema.total
@@ -139,8 +178,8 @@ class TaskService:
             else:
                 title = random.choice(titles_copy)
 
-            task_data = (task_schema.id, client_manager, session_name, title)
-            queue_manager.create_channel_queue.put_nowait(task_data)
+            task_data = (task_schema.id, session_name, title)
+            await client_manager.enqueue('create_channel_queue', session_name, task_data)
 
         await self.crud.update(task_schema.id, {'status': TaskStatus.RUNNING})
 
@@ -150,27 +189,21 @@ class TaskService:
             client_manager: ClientManager
     ):
         args = task_schema.args
-        channels_to_accounts: List[AccountChannelModel] = []
-        channel_ids = args['channel_ids']
-        for cid in channel_ids:
-            channel_to_account: AccountChannelModel | None = await AccountChannelCRUD().get_with_channel_account(cid)
-            if channel_to_account is None:
-                raise NotFoundRecordError(f'未查询到此频道相关的记录: {cid}')
-            channels_to_accounts.append(channel_to_account)
+        channels_to_accounts, unusable = await self.split_usable_channel_links(args['channel_ids'], client_manager)
 
         for c2a in channels_to_accounts:
-            username = generate_username(c2a.channel.tid)
+            # 用户名由 worker 处理时从已验证可用的用户名池中取
             task_data = (
                 task_schema.id,
-                client_manager,
                 c2a.account.session_name,
                 c2a.channel.tid,
                 c2a.access_hash,
-                username
+                None
             )
-            queue_manager.set_channel_username_queue.put_nowait(task_data)
+            await client_manager.enqueue('set_channel_username_queue', c2a.account.session_name, task_data)
 
         await self.crud.update(task_schema.id, {'status': TaskStatus.RUNNING})
+        await self.skip_unusable_channel_links(task_schema.id, unusable)
 
     async def start_batch_set_channel_photo(
             self,
@@ -179,29 +212,22 @@ class TaskService:
             client_manager: ClientManager
     ):
         args = task_schema.args
-        c2a_list: List[AccountChannelModel] = []
-        channel_ids = args['channel_ids']
-        for cid in channel_ids:
-            c2a: AccountChannelModel | None = await AccountChannelCRUD().get_with_channel_account(cid)
-            if c2a is None:
-                raise NotFoundRecordError(f'未查询到此频道相关记录: {cid}')
-
-            c2a_list.append(c2a)
+        c2a_list, unusable = await self.split_usable_channel_links(args['channel_ids'], client_manager)
 
         for c2a in c2a_list:
             photo_filename = await MediaService().get_random_avatar_by_user_id(user_id)
             photo_path = str(settings.MEDIA_ROOT / photo_filename)
             task_data = (
                 task_schema.id,
-                client_manager,
                 c2a.account.session_name,
                 c2a.channel.tid,
                 c2a.access_hash,
                 photo_path,
             )
-            queue_manager.set_channel_photo_queue.put_nowait(task_data)
+            await client_manager.enqueue('set_channel_photo_queue', c2a.account.session_name, task_data)
 
         await self.crud.update(task_schema.id, {'status': TaskStatus.RUNNING})
+        await self.skip_unusable_channel_links(task_schema.id, unusable)
 
     async def start_batch_set_channel_description(
             self,
@@ -209,28 +235,63 @@ class TaskService:
             client_manager: ClientManager
     ):
         args = task_schema.args
-        c2a_list: List[AccountChannelModel] = []
-        channel_ids = args['channel_ids']
-        for cid in channel_ids:
-            c2a: AccountChannelModel | None = await AccountChannelCRUD().get_with_channel_account(cid)
-            if c2a is None:
-                raise NotFoundRecordError(f'未查询到此频道相关记录: {cid}')
-            c2a_list.append(c2a)
+        c2a_list, unusable = await self.split_usable_channel_links(args['channel_ids'], client_manager)
 
         for c2a in c2a_list:
             description = args['description']
             task_data = (
                 task_schema.id,
-                client_manager,
                 c2a.account.session_name,
                 c2a.channel.tid,
                 c2a.access_hash,
                 description,
             )
-            queue_manager.set_channel_description_queue.put_nowait(task_data)
+            await client_manager.enqueue('set_channel_description_queue', c2a.account.session_name, task_data)
+
+        await self.crud.update(task_schema.id, {'status': TaskStatus.RUNNING})
+        await self.skip_unusable_channel_links(task_schema.id, unusable)
+
+    async def start_batch_set_channel_account(
+            self,
+            task_schema: TaskResponse,
+            client_manager: ClientManager
+    ):
+        args = task_schema.args
+        accounts = await AccountCRUD().list_authenticated_by_ids(args['account_ids'])
+        missing = set(args['account_ids']) - {account.id for account in accounts}
+        if missing:
+            raise NotFoundRecordError(f'未查询到已登录的账号: {sorted(missing)}')
+
+        c2a_list, unusable = await self.split_usable_channel_links(args['channel_ids'], client_manager, can_add_admins)
+        existing = set(await AccountChannelCRUD().list_account_ids_by_channel_ids(args['channel_ids']))
+
+        already_admins = []
+        for c2a in c2a_list:
+            for account in accounts:
+                if (c2a.channel_id, account.id) in existing:
+                    already_admins.append((c2a, account))
+                    continue
+                task_data = (
+                    task_schema.id,
+                    c2a.account.session_name,
+                    c2a.channel.tid,
+                    c2a.access_hash,
+                    account.username,
+                    account.phone,
+                )
+                await client_manager.enqueue('set_channel_account_queue', c2a.account.session_name, task_data)
 
         await self.crud.update(task_schema.id, {'status': TaskStatus.RUNNING})
 
+        for c2a, account in already_admins:
+            log = f'任务 {task_schema.id} 账号 {account.phone} 已是频道 {c2a.channel.tid} 的管理员'
+            await self.update_task_status_with_increment_success_and_log(task_schema.id, log)
+        for c2a in unusable:
+            for account in accounts:
+                log = f'任务 {task_schema.id} 频道 {c2a.channel.tid} 没有可添加管理员的账号, 已跳过 {account.phone}'
+                await self.update_task_status_with_increment_failure_and_log(task_schema.id, log)
+                logger.warning(log)
+
     async def start_task(self, task_id: int, user_id: int, client_manager: ClientManager):
         # TODO: 有待优化，这一步是判断任务是否存在兼任务是否属于当前用户
         task = await self.crud.get_with_user_id(task_id, user_id)
@@ -254,6 +315,9 @@ class TaskService:
         if task_type == TaskType.SET_DESCRIPTION:
             return await self.start_batch_set_channel_description(task_schema, client_manager)
 
+        if task_type == TaskType.SET_ACCOUNT:
+            return await self.start_batch_set_channel_account(task_schema, client_manager)
+
         raise UnsupportedTaskTypeError('不支持的任务类型')
 
     async def delete_task(self, task_id: int, user_id: int):
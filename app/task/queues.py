@@ -1,5 +1,5 @@
 import asyncio
-
+from typing import Any
 
 
 class QueueManager:
@@ -8,9 +8,16 @@ class QueueManager:
         self.set_channel_username_queue = asyncio.Queue()
         self.set_channel_description_queue = asyncio.Queue()
         self.set_channel_photo_queue = asyncio.Queue()
+        self.set_channel_account_queue = asyncio.Queue()
+        self.publish_message_queue = asyncio.Queue()
 
+    def get(self, queue_name: str) -> asyncio.Queue:
+        return getattr(self, queue_name)
 
+    @staticmethod
+    def park(queue: asyncio.Queue, item: Any, delay: float):
+        """在 delay 秒后将任务重新放回队列, 期间 worker 可以继续处理其他账号的任务"""
+        asyncio.get_running_loop().call_later(delay, queue.put_nowait, item)
 
 
-
-queue_manager = QueueManager()
\ No newline at end of file
+queue_manager = QueueManager()
@@ -4,11 +4,11 @@ from uuid import uuid4
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from app.core.channel_routing import route_channel_links, is_usable
 from app.core.config import settings
-from app.core.telegram_client import ClientManager
+from app.core.telegram_client import ClientManager, OPERATION_UPLOAD
 from app.core.telegram_client import send_message_to_channel, send_file_to_channel
-from app.crud.account_channel import AccountChannelCRUD
-from app.db.models import AccountChannelModel
+from app.exceptions import RateLimitedError
 from app.services.media import MediaService
 from app.utils.channel_tools import generate_random_times, generate_channel_message_to_publish, tid_to_chat_id
 from zoneinfo import ZoneInfo
@@ -18,8 +18,8 @@ logger = logging.getLogger(__name__)
 
 
 async def process_publish_message(
-        user_id: int,
         client_manager: ClientManager,
+        user_id: int,
         tid: int,
         lang: str,
         session_name: str,
@@ -30,31 +30,83 @@ async def process_publish_message(
         include_primary_links: bool,
         primary_links: str,
         ai_prompt,
+        message_text: str | None = None,
+        media_list: List[str] | None = None,
 ):
-    message_text = await generate_channel_message_to_publish(ai_prompt, lang, min_word_count, max_word_count)
+    """message_text / media_list 为上次被限流前已生成的内容, 重试时直接复用, 不再重复调用 AI 和挑选媒体"""
+    if message_text is None:
+        message_text = await generate_channel_message_to_publish(ai_prompt, lang, min_word_count, max_word_count)
 
-    media_list = []
-    if include_imgs:
-        img = await MediaService().get_random_img_by_user_id(user_id)
-        img_path = str(settings.MEDIA_ROOT / img)
-        media_list.append(img_path)
+        media_list = []
+        if include_imgs:
+            img = await MediaService().get_random_img_by_user_id(user_id)
+            img_path = str(settings.MEDIA_ROOT / img)
+            media_list.append(img_path)
 
-    if include_videos:
-        video = await MediaService().get_random_video_by_user_id(user_id)
-        video_path = str(settings.MEDIA_ROOT / video)
-        media_list.append(video_path)
+        if include_videos:
+            video = await MediaService().get_random_video_by_user_id(user_id)
+            video_path = str(settings.MEDIA_ROOT / video)
+            media_list.append(video_path)
 
-    if include_primary_links:
-        message_text += f'\nSubscribe us: {primary_links}'
+        if include_primary_links:
+            message_text += f'\nSubscribe us: {primary_links}'
 
-    async with client_manager.get_client(session_name) as client:
-        chat_id = tid_to_chat_id(tid)
-        if media_list:
-            await send_file_to_channel(client, chat_id, media_list, message_text)
-            logger.info(f'{tid} - {media_list} - {message_text} successfully sent')
-        else:
-            await send_message_to_channel(client, chat_id, message_text)
-            logger.info(f'{tid} - {media_list} - {message_text} successfully sent')
+    operation = OPERATION_UPLOAD if media_list else None
+    method = 'SendMediaRequest' if media_list else 'SendMessageRequest'
+    peer = client_manager.peer_cache.input_peer(session_name, tid) or tid_to_chat_id(tid)
+    try:
+        async with client_manager.get_client(session_name, operation, method) as client:
+            with client_manager.peer_cache.guard(session_name, tid):
+                if media_list:
+                    await send_file_to_channel(
+                        client, peer, media_list, message_text, client_manager.upload_cache, session_name
+                    )
+                    logger.info(f'{tid} - {media_list} - {message_text} successfully sent')
+                else:
+                    await send_message_to_channel(client, peer, message_text)
+                    logger.info(f'{tid} - {media_list} - {message_text} successfully sent')
+    except RateLimitedError as e:
+        retry_data = (
+            user_id, tid, lang, session_name, min_word_count, max_word_count, include_imgs, include_videos,
+            include_primary_links, primary_links, ai_prompt, message_text, media_list,
+        )
+        raise RateLimitedError(e.seconds, str(e), retry_data=retry_data) from e
+
+
+async def enqueue_publish_message(
+        client_manager: ClientManager,
+        user_id: int,
+        channel_id: int,
+        min_word_count: int,
+        max_word_count: int,
+        ai_prompt: str,
+        include_imgs: bool,
+        include_videos: bool,
+        include_primary_links: bool,
+):
+    # 到点后再为频道选择当前负载最低的管理账号, 只把发布任务投递到该账号所在的队列, 由 worker 执行
+    c2a = (await route_channel_links(client_manager, [channel_id])).get(channel_id)
+    if c2a is None or not is_usable(c2a):
+        logger.warning(f'频道 {channel_id} 已被封禁或没有可管理的账号, 跳过本次发布')
+        return
+
+    await client_manager.enqueue(
+        'publish_message_queue',
+        c2a.account.session_name,
+        (
+            user_id,
+            c2a.channel.tid,
+            c2a.channel.lang,
+            c2a.account.session_name,
+            min_word_count,
+            max_word_count,
+            include_imgs,
+            include_videos,
+            include_primary_links,
+            c2a.channel.primary_link,
+            ai_prompt,
+        ),
+    )
 
 
 async def create_daily_publish_message_scheduler(
@@ -73,27 +125,22 @@ async def create_daily_publish_message_scheduler(
         shanghai_tz = ZoneInfo('Asia/Shanghai')
         start_time = datetime.now(shanghai_tz)
         for cid in channels_ids:
-            c2a: AccountChannelModel | None = await AccountChannelCRUD().get_with_channel_account(cid)
             times = generate_random_times(start_time)
-            primary_links =c2a.channel.primary_link
             for t in times:
                 scheduler.add_job(
-                    func=process_publish_message,
+                    func=enqueue_publish_message,
                     trigger='date',
                     run_date=t,
                     args=[
-                        user_id,
                         client_manager,
-                        c2a.channel.tid,
-                        c2a.channel.lang,
-                        c2a.account.session_name,
+                        user_id,
+                        cid,
                         min_word_count,
                         max_word_count,
+                        ai_prompt,
                         include_imgs,
                         include_videos,
                         include_primary_links,
-                        primary_links,
-                        ai_prompt,
                     ],
                     id=str(uuid4()),
                     replace_existing=True,
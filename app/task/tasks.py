@@ -1,85 +1,195 @@
 import logging
+import time
+from typing import List, Tuple, Callable
 
-from app.core.telegram_client import ClientManager, create_channel, set_channel_username, set_channel_photo, \
-    set_channel_description
+from telethon import types, errors
+from telethon.tl.tlobject import TLRequest
+
+from app.core.telegram_client import ClientManager, create_channel, set_channel_photo, OPERATION_UPLOAD, \
+    invoke_batch, set_channel_username_request, set_channel_description_request, add_channel_admin
+from app.core.username_pool import username_pool
+from app.exceptions import RateLimitedError
 from app.services.task import TaskService
+from app.utils.channel_tools import generate_username
 
 logger = logging.getLogger(__name__)
 
 
 async def process_create_channel(
-        task_id: int,
         client_manager: ClientManager,
+        task_id: int,
         session_name: str,
         title: str
 ):
     try:
-        async with client_manager.get_client(session_name) as client:
+        async with client_manager.get_client(session_name, method='CreateChannelRequest') as client:
             new_channel = await create_channel(client, title)
-            log = f'任务 {task_id} 创建频道成功: {new_channel.id} - {new_channel.title}'
-            await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
-            logger.info(log)
+        # 数据库写入放在 get_client 之外, 不计入账号的调用耗时与健康分
+        client_manager.peer_cache.put(session_name, new_channel.id, new_channel.access_hash)
+        log = f'任务 {task_id} 创建频道成功: {new_channel.id} - {new_channel.title}'
+        await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
+        logger.info(log)
+    except RateLimitedError:
+        raise
     except Exception as e:
         logger.error(f'任务 {task_id} 创建频道失败: {e}')
         log = f'任务 {task_id} 创建频道失败: {title} - {e}'
         await TaskService().update_task_status_with_increment_failure_and_log(task_id, log)
 
 
-async def process_set_channel_username(
-        task_id: int,
+async def _process_channel_edit_batch(
         client_manager: ClientManager,
         session_name: str,
-        channel_tid: int,
-        access_hash: int,
-        username: str,
-):
+        items: List[Tuple],
+        method: str,
+        field: str,
+        build_request: Callable[[types.InputChannel, str], TLRequest],
+        on_failure: Callable[[str, Exception], None] | None = None,
+        resolve_value: Callable[[Tuple], str] | None = None,
+) -> List[Tuple[Tuple, float]]:
+    """
+    items 中每一项为 (task_id, session_name, channel_tid, access_hash, value),
+    同一账号的请求合并为一个容器发送, 每个请求的结果单独记录到对应任务; 返回遭遇 FloodWait 需要稍后重试的任务及等待秒数.
+    resolve_value 在拿到账号名额和令牌之后才调用, 用于确定每一项的实际值, 返回的重试任务中携带确定后的值.
+    """
+    prepared: List[Tuple] | None = None
+    latency_ms = None
     try:
-        async with client_manager.get_client(session_name) as client:
-            await set_channel_username(client, channel_tid, access_hash, username)
-            log = f'任务 {task_id} 设置频道 {channel_tid} username: {username} 成功'
-            await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
+        # 容器内各请求结果不同, 健康分在下面按每个请求的结果分别记录
+        async with client_manager.get_client(
+                session_name, method=method, count=len(items), record_health=False
+        ) as client:
+            prepared = [(*item[:4], resolve_value(item)) for item in items] if resolve_value else items
+            requests = [
+                build_request(client_manager.peer_cache.input_channel(session_name, channel_tid, access_hash), value)
+                for _, _, channel_tid, access_hash, value in prepared
+            ]
+            started = time.monotonic()
+            results = await invoke_batch(client, requests)
+            latency_ms = (time.monotonic() - started) * 1000 / len(items)
+    except RateLimitedError as e:
+        if prepared is None:
+            raise
+        # 值已确定后才被限流: 带着确定后的值重试
+        return [(item, e.seconds) for item in prepared]
+    except Exception as e:
+        # 整个容器失败(如连接断开)只计一次
+        client_manager.health.record_error(session_name, e)
+        results = [e] * len(items)
+    else:
+        for result in results:
+            if isinstance(result, errors.FloodWaitError):
+                client_manager.health.record_flood_wait(session_name)
+            elif isinstance(result, Exception):
+                client_manager.health.record_error(session_name, result)
+            else:
+                client_manager.health.record_success(session_name, latency_ms)
+    items = prepared or items
+
+    retry = []
+    for item, result in zip(items, results):
+        task_id, _, channel_tid, _, value = item
+        if isinstance(result, errors.FloodWaitError):
+            retry.append((item, result.seconds))
+            continue
 
+        if isinstance(result, Exception):
+            if isinstance(result, errors.ChannelInvalidError):
+                client_manager.peer_cache.invalidate(session_name, channel_tid)
+            if on_failure is not None:
+                on_failure(value, result)
+            log = f'任务 {task_id} 设置频道 {channel_tid} {field}: {value} 失败: {result}'
+            await TaskService().update_task_status_with_increment_failure_and_log(task_id, log)
+            logger.error(log)
+        else:
+            log = f'任务 {task_id} 设置频道 {channel_tid} {field}: {value} 成功'
+            await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
             logger.info(log)
-    except Exception as e:
-        log = f'任务 {task_id} 设置频道 {channel_tid} username: {username} 失败: {e}'
-        await TaskService().update_task_status_with_increment_failure_and_log(task_id, log)
-        logger.error(log)
+
+    if retry:
+        client_manager.rate_limiter.record_flood_wait(session_name, method, max(seconds for _, seconds in retry))
+    return retry
+
+
+def _username_failed(username: str, error: Exception):
+    if isinstance(error, (errors.UsernameOccupiedError, errors.UsernameInvalidError)):
+        username_pool.mark_taken(username)
+
+
+def _resolve_username(item: Tuple) -> str:
+    # 用户名在拿到令牌后才从预先验证过的用户名池中取, 池为空时退回随机生成; 取定后随任务重试保持不变
+    _, _, channel_tid, _, username = item
+    return username or username_pool.take() or generate_username(channel_tid)
+
+
+async def process_set_channel_username_batch(
+        client_manager: ClientManager,
+        session_name: str,
+        items: List[Tuple],
+) -> List[Tuple[Tuple, float]]:
+    return await _process_channel_edit_batch(
+        client_manager, session_name, items, 'UpdateUsernameRequest', 'username', set_channel_username_request,
+        on_failure=_username_failed,
+        resolve_value=_resolve_username,
+    )
 
 
 async def process_set_channel_photo(
-        task_id: int,
         client_manager: ClientManager,
+        task_id: int,
         session_name: str,
         channel_tid: int,
         access_hash: int,
         photo_path: str,
 ):
     try:
-        async with client_manager.get_client(session_name) as client:
-            await set_channel_photo(client, channel_tid, access_hash, photo_path)
-            log = f'任务 {task_id} 设置频道 {channel_tid} photo: {photo_path} 成功'
-            await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
+        input_channel = client_manager.peer_cache.input_channel(session_name, channel_tid, access_hash)
+        async with client_manager.get_client(session_name, OPERATION_UPLOAD, 'EditPhotoRequest') as client:
+            with client_manager.peer_cache.guard(session_name, channel_tid):
+                await set_channel_photo(
+                    client, input_channel, photo_path, client_manager.upload_cache, session_name
+                )
+        log = f'任务 {task_id} 设置频道 {channel_tid} photo: {photo_path} 成功'
+        await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
+    except RateLimitedError:
+        raise
     except Exception as e:
         log = f'任务 {task_id} 设置频道 {channel_tid} photo: {photo_path} 失败: {e}'
         await TaskService().update_task_status_with_increment_failure_and_log(task_id, log)
         logger.error(log)
 
 
-async def process_set_channel_description(
-        task_id: int,
+async def process_set_channel_description_batch(
         client_manager: ClientManager,
         session_name: str,
+        items: List[Tuple],
+) -> List[Tuple[Tuple, float]]:
+    return await _process_channel_edit_batch(
+        client_manager, session_name, items, 'EditChatAboutRequest', 'description', set_channel_description_request
+    )
+
+
+async def process_set_channel_account(
+        client_manager: ClientManager,
+        task_id: int,
+        session_name: str,
         channel_tid: int,
         access_hash: int,
-        description: str,
+        username: str | None,
+        phone: str,
 ):
     try:
-        async with client_manager.get_client(session_name) as client:
-            await set_channel_description(client, channel_tid, access_hash, description)
-            log = f'任务 {task_id} 设置频道 {channel_tid} description: {description} 成功'
-            await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
-            logger.info(log)
+        input_channel = client_manager.peer_cache.input_channel(session_name, channel_tid, access_hash)
+        async with client_manager.get_client(session_name, method='EditAdminRequest') as client:
+            with client_manager.peer_cache.guard(session_name, channel_tid):
+                await add_channel_admin(client, input_channel, username, phone)
+        # 新管理员与频道的关联由该账号下一次频道同步写入
+        log = f'任务 {task_id} 添加账号 {phone} 为频道 {channel_tid} 管理员成功'
+        await TaskService().update_task_status_with_increment_success_and_log(task_id, log)
+        logger.info(log)
+    except RateLimitedError:
+        raise
     except Exception as e:
-        log = f'任务 {task_id} 设置频道 {channel_tid} description: {description} 失败: {e}'
+        log = f'任务 {task_id} 添加账号 {phone} 为频道 {channel_tid} 管理员失败: {e}'
         await TaskService().update_task_status_with_increment_failure_and_log(task_id, log)
         logger.error(log)
@@ -1,61 +1,133 @@
 import asyncio
 import logging
+from typing import Callable, Awaitable, List, Dict, Tuple
 
 from app.core.config import settings
+from app.core.telegram_client import ClientManager
+from app.exceptions import RateLimitedError
 from .queues import queue_manager
-from .tasks import process_create_channel, process_set_channel_username, process_set_channel_photo, \
-    process_set_channel_description
+from .schedules import process_publish_message
+from .tasks import process_create_channel, process_set_channel_username_batch, process_set_channel_photo, \
+    process_set_channel_description_batch, process_set_channel_account
 
 logger = logging.getLogger(__name__)
 
 
-async def create_channel_worker():
-    logger.info('正在初始化 create_channel_worker...')
+async def run_worker(
+        queue_name: str,
+        process: Callable[..., Awaitable],
+        client_manager: ClientManager,
+        session_index: int = 1,
+):
+    """session_index 为任务数据中账号会话名的位置, 任务处理完(而不是暂缓重试)后从该账号的排队数中扣除"""
+    logger.info(f'正在初始化 {queue_name} worker...')
+    queue = queue_manager.get(queue_name)
     while True:
+        task_data = await queue.get()
+        parked = False
         try:
-            task_data = await queue_manager.create_channel_queue.get()
-            await process_create_channel(*task_data)
-            queue_manager.create_channel_queue.task_done()
+            await process(client_manager, *task_data)
+        except RateLimitedError as e:
+            logger.warning(f'{e}, {queue_name} 任务 {task_data[0]} 暂缓 {e.seconds:.0f} 秒后重试')
+            queue_manager.park(queue, e.retry_data or task_data, e.seconds)
+            parked = True
         except Exception as e:
-            logger.error(f'Failed to create channel worker: {e}')
-            queue_manager.create_channel_queue.task_done()
+            logger.error(f'{queue_name} worker 处理任务失败: {e}')
             await asyncio.sleep(settings.TASK_INTERVAL_TIME)
+        finally:
+            if not parked:
+                client_manager.task_done(task_data[session_index])
+            queue.task_done()
 
 
-async def set_channel_username_worker():
-    logger.info('正在初始化 set_channel_username_worker...')
-    while True:
+async def _run_session_batches(
+        queue_name: str,
+        queue: asyncio.Queue,
+        process_batch: Callable[..., Awaitable[List[Tuple[Tuple, float]]]],
+        client_manager: ClientManager,
+        session_name: str,
+        items: List[Tuple],
+        batch_size: int,
+):
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
         try:
-            task_data = await queue_manager.set_channel_username_queue.get()
-            await process_set_channel_username(*task_data)
-            queue_manager.set_channel_username_queue.task_done()
+            retry = await process_batch(client_manager, session_name, batch)
+        except RateLimitedError as e:
+            logger.warning(f'{e}, {queue_name} 中 {session_name} 的 {len(batch)} 个任务暂缓 {e.seconds:.0f} 秒后重试')
+            retry = [(item, e.seconds) for item in batch]
         except Exception as e:
-            logger.error(f'Failed to set channel username worker: {e}')
-            queue_manager.set_channel_username_queue.task_done()
+            logger.error(f'{queue_name} worker 处理 {session_name} 的批量任务失败: {e}')
+            client_manager.task_done(session_name, len(batch))
             await asyncio.sleep(settings.TASK_INTERVAL_TIME)
+            continue
+
+        client_manager.task_done(session_name, len(batch) - len(retry))
+        for item, delay in retry:
+            queue_manager.park(queue, item, delay)
 
 
-async def set_channel_photo_worker():
-    logger.info('正在初始化 set_channel_photo_worker...')
+async def run_batch_worker(
+        queue_name: str,
+        process_batch: Callable[..., Awaitable[List[Tuple[Tuple, float]]]],
+        client_manager: ClientManager,
+):
+    """
+    取出队列中当前所有任务, 按账号分组后每 TASK_BATCH_SIZE 个合并为一次调用;
+    不同账号并发处理, 同一账号的批次依次处理.
+    """
+    logger.info(f'正在初始化 {queue_name} worker...')
+    queue = queue_manager.get(queue_name)
+    batch_size = max(1, min(settings.TASK_BATCH_SIZE, client_manager.rate_limiter.capacity))
     while True:
-        try:
-            task_data = await queue_manager.set_channel_photo_queue.get()
-            await process_set_channel_photo(*task_data)
-            queue_manager.set_channel_photo_queue.task_done()
-        except Exception as e:
-            logger.error(f'Failed to set channel photo worker: {e}')
-            queue_manager.set_channel_photo_queue.task_done()
-            await asyncio.sleep(settings.TASK_INTERVAL_TIME)
+        items = [await queue.get()]
+        while not queue.empty():
+            items.append(queue.get_nowait())
 
+        groups: Dict[str, List[Tuple]] = {}
+        for item in items:
+            groups.setdefault(item[1], []).append(item)
 
-async def set_channel_description_worker():
-    logger.info('正在初始化 set_channel_description_worker...')
-    while True:
         try:
-            task_data = await queue_manager.set_channel_description_queue.get()
-            await process_set_channel_description(*task_data)
-            queue_manager.set_channel_description_queue.task_done()
-        except Exception as e:
-            logger.error(f'Failed to set channel description worker: {e}')
-            queue_manager.set_channel_description_queue.task_done()
-            await asyncio.sleep(settings.TASK_INTERVAL_TIME)
+            await asyncio.gather(*[
+                _run_session_batches(queue_name, queue, process_batch, client_manager, session_name, group, batch_size)
+                for session_name, group in groups.items()
+            ])
+        finally:
+            for _ in items:
+                queue.task_done()
+
+
+async def create_channel_worker(client_manager: ClientManager):
+    await run_worker('create_channel_queue', process_create_channel, client_manager)
+
+
+async def set_channel_username_worker(client_manager: ClientManager):
+    await run_batch_worker('set_channel_username_queue', process_set_channel_username_batch, client_manager)
+
+
+async def set_channel_photo_worker(client_manager: ClientManager):
+    await run_worker('set_channel_photo_queue', process_set_channel_photo, client_manager)
+
+
+async def set_channel_description_worker(client_manager: ClientManager):
+    await run_batch_worker('set_channel_description_queue', process_set_channel_description_batch, client_manager)
+
+
+async def set_channel_account_worker(client_manager: ClientManager):
+    await run_worker('set_channel_account_queue', process_set_channel_account, client_manager)
+
+
+async def publish_message_worker(client_manager: ClientManager):
+    await run_worker('publish_message_queue', process_publish_message, client_manager, session_index=3)
+
+
+def start_workers(client_manager: ClientManager) -> List[asyncio.Task]:
+    return [
+        asyncio.create_task(create_channel_worker(client_manager)),
+        asyncio.create_task(set_channel_username_worker(client_manager)),
+        asyncio.create_task(set_channel_photo_worker(client_manager)),
+        asyncio.create_task(set_channel_description_worker(client_manager)),
+        asyncio.create_task(set_channel_account_worker(client_manager)),
+        *[asyncio.create_task(publish_message_worker(client_manager)) for _ in range(settings.PUBLISH_WORKERS)],
+    ]
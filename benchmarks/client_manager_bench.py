@@ -0,0 +1,72 @@
+"""
+ClientManager 读路径压测: 在 1k~10k 个已注册会话下, 用数百个并发调用方测量 get_client / is_online 吞吐量.
+
+用法: python -m benchmarks.client_manager_bench --sessions 1000 5000 10000 --callers 100 500 --ops 200
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from app.core.telegram_client import ClientManager, ClientEntry
+
+
+class FakeClient:
+    def is_connected(self) -> bool:
+        return True
+
+    async def disconnect(self):
+        pass
+
+
+def build_manager(sessions_count: int) -> ClientManager:
+    client_manager = ClientManager(
+        api_id=0,
+        api_hash='',
+        proxy_pool=None,
+        sessions_root='',
+    )
+    for i in range(sessions_count):
+        client_manager._put_entry(f'bench{i}', ClientEntry(FakeClient()))
+    return client_manager
+
+
+async def is_online_caller(client_manager: ClientManager, names: List[str], ops: int):
+    for _ in range(ops):
+        await client_manager.is_online(random.choice(names))
+
+
+async def get_client_caller(client_manager: ClientManager, names: List[str], ops: int):
+    for _ in range(ops):
+        async with client_manager.get_client(random.choice(names)):
+            await asyncio.sleep(0)
+
+
+async def run_case(sessions_count: int, callers: int, ops: int):
+    client_manager = build_manager(sessions_count)
+    names = [f'bench{i}' for i in range(sessions_count)]
+
+    for label, caller in (('is_online', is_online_caller), ('get_client', get_client_caller)):
+        start = time.perf_counter()
+        await asyncio.gather(*[caller(client_manager, names, ops) for _ in range(callers)])
+        elapsed = time.perf_counter() - start
+        total_ops = callers * ops
+        print(f'{label:<10} sessions={sessions_count:<6} callers={callers:<5} '
+              f'ops={total_ops:<8} {total_ops / elapsed:>12.0f} ops/s')
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--callers', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--ops', type=int, default=200)
+    args = parser.parse_args()
+
+    for sessions_count in args.sessions:
+        for callers in args.callers:
+            await run_case(sessions_count, callers, args.ops)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
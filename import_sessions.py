@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.core.session_storage import read_sqlite_session, read_string_session
+from app.crud.user import UserCRUD
+from app.db.register import connect_to_db, close_db_connection
+from app.services.account import AccountService
+
+
+def collect_session_files(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(path.glob('*.session'))
+        else:
+            yield path
+
+
+def read_string_sessions(path: Path):
+    # 每行: 手机号 StringSession [二步验证密码]
+    for line in path.read_text().splitlines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        phone, string_session = parts[0], parts[1]
+        two_fa = parts[2] if len(parts) > 2 else ''
+        yield phone, two_fa, read_string_session(string_session, phone)
+
+
+async def import_sessions(username: str, paths, strings_file: str | None):
+    await connect_to_db()
+
+    user = await UserCRUD().get_by_username(username)
+    if user is None:
+        print(f'User {username} not found')
+        await close_db_connection()
+        return
+
+    items = []
+    for session_file in collect_session_files(paths):
+        try:
+            items.append((session_file.stem, '', read_sqlite_session(session_file, session_file.stem)))
+        except Exception as e:
+            print(f'Skip {session_file.name}: {e}')
+    if strings_file:
+        items.extend(read_string_sessions(Path(strings_file)))
+
+    print(f'Validating {len(items)} sessions...')
+    result = await AccountService().import_sessions(user.id, items)
+    print(f'Imported {result.imported}, failed {len(result.failed)}')
+    for item in result.failed:
+        print(f'  {item.phone}: {item.error}')
+
+    await close_db_connection()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import authorized Telegram sessions as accounts')
+    parser.add_argument('--user', required=True, help='owner username')
+    parser.add_argument('--strings', help='file with lines: phone string_session [two_fa]')
+    parser.add_argument('paths', nargs='*', help='.session files or directories, named by phone')
+    args = parser.parse_args()
+    asyncio.run(import_sessions(args.user, args.paths, args.strings))
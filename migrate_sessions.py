@@ -0,0 +1,31 @@
+import asyncio
+
+from app.core.config import settings
+from app.core.session_storage import read_sqlite_session
+from app.crud.session import TelegramSessionCRUD
+from app.db.register import connect_to_db, close_db_connection
+
+
+async def migrate_sessions(batch_size: int = 100):
+    await connect_to_db()
+
+    session_files = sorted(settings.TELEGRAM_SESSIONS_ROOT.glob('*.session'))
+    print(f'Found {len(session_files)} session files in {settings.TELEGRAM_SESSIONS_ROOT}')
+
+    migrated = 0
+    for start in range(0, len(session_files), batch_size):
+        rows = []
+        for session_file in session_files[start:start + batch_size]:
+            try:
+                rows.append(read_sqlite_session(session_file))
+            except Exception as e:
+                print(f'Skip {session_file.name}: {e}')
+        await TelegramSessionCRUD().bulk_upsert(rows)
+        migrated += len(rows)
+        print(f'Migrated {migrated}/{len(session_files)}')
+
+    await close_db_connection()
+
+
+if __name__ == '__main__':
+    asyncio.run(migrate_sessions())